@@ -0,0 +1,145 @@
+"""In-process benchmark cases for the Lambda handlers and DbManager.
+
+The environment (DB_APP_SECRET etc.) must be configured before this module is imported, see ``benchmarks.__main__``.
+"""
+import itertools
+import json
+import random
+
+from sqlalchemy import delete, insert, text
+
+from benchmarks.harness import measure, BenchmarkResult
+from benchmarks.model_serialization import build_rows
+from lambdas import cognito_hooks, models, user_import, users
+from lambdas.models import Base, UserAccount
+from lambdas.services import secrets_service, user_service
+from lambdas.services.db_manager import get_app_db
+
+IDENTITY = 'bench_identity'
+SEED_CHUNK = 10_000
+BATCH_SIZE = 25
+LIST_PAGE_SIZES = (100, 1000)
+
+_counter = itertools.count()
+
+
+def reset_container():
+    """Drop every container-level cache so the next invocation behaves like the first one on a cold container."""
+    get_app_db().dispose()
+    secrets_service.invalidate_secret()
+    models._PLANS.clear()  # pylint: disable=protected-access
+    user_service._user_cache.invalidate()  # pylint: disable=protected-access
+
+
+def prepare_database():
+    db = get_app_db()
+    with db:
+        Base.metadata.create_all(db.session.get_bind())
+        db.session.execute(delete(UserAccount))
+        db.session.commit()
+    seed_users(0)
+
+
+def seed_users(count: int):
+    """Replace the user_account contents with the benchmark identity plus ``count`` generated users."""
+    db = get_app_db()
+    with db:
+        db.session.execute(delete(UserAccount))
+        db.session.execute(insert(UserAccount), [_user_row(IDENTITY)])
+        for start in range(0, count, SEED_CHUNK):
+            db.session.execute(insert(UserAccount),
+                               [_user_row(seeded_user_name(i)) for i in range(start, min(start + SEED_CHUNK, count))])
+        db.session.commit()
+
+
+def seeded_user_name(index: int) -> str:
+    return f"user_{index:08d}"
+
+
+def _user_row(user_name: str) -> dict:
+    return {'id': models.uuid4(), 'user_name': user_name, 'name': user_name.title(),
+            'email': f"{user_name}@example.com.invalid"}
+
+
+def appsync_event(field_name: str, arguments: dict = None) -> dict:
+    return {'info': {'fieldName': field_name}, 'arguments': arguments or {}, 'identity': {'username': IDENTITY}}
+
+
+def cognito_event(trigger_source: str, user_name: str = IDENTITY) -> dict:
+    return {
+        'triggerSource': trigger_source,
+        'userName': user_name,
+        'request': {
+            'userAttributes': {'name': user_name.title(), 'email': f"{user_name}@example.com.invalid",
+                               'custom:groups': '[SYSADMIN]'},
+            'groupConfiguration': {'groupsToOverride': [], 'iamRolesToOverride': [], 'preferredRole': None},
+        },
+    }
+
+
+def db_session_roundtrip():
+    db = get_app_db()
+    with db:
+        db.session.execute(text('SELECT 1'))
+
+
+def handler_cases(iterations: int, cold_iterations: int) -> list[BenchmarkResult]:
+    user_query = appsync_event('user')
+    get_user = appsync_event('getUser', {'userName': IDENTITY})
+    token = cognito_event('TokenGeneration_RefreshTokens')
+    post_auth = cognito_event('PostAuthentication_Authentication')
+    rows = build_rows(1)
+
+    def post_confirmation():
+        cognito_hooks.handler(cognito_event('PostConfirmation_ConfirmSignUp', f"new_{next(_counter):08d}"), None)
+
+    cases = [
+        ('db_session', db_session_roundtrip),
+        ('users.user', lambda: users.handler(user_query, None)),
+        ('users.getUser', lambda: users.handler(get_user, None)),
+        ('users.getUser_batch', lambda: users.handler([get_user] * BATCH_SIZE, None)),
+        ('cognito.token_generation', lambda: cognito_hooks.handler(token, None)),
+        ('cognito.post_authentication', lambda: cognito_hooks.handler(post_auth, None)),
+        ('cognito.post_confirmation', post_confirmation),
+        ('model.to_dict', lambda: rows[0].to_dict()),
+    ]
+
+    results = []
+    for name, fn in cases:
+        results.append(measure(name, 'cold', fn, cold_iterations, setup=reset_container))
+        results.append(measure(name, 'warm', fn, iterations, warmup=5))
+    return results
+
+
+def import_cases(sizes: list[int]) -> list[BenchmarkResult]:
+    """Bulk import of ``size`` users, half of them already present with changed attributes."""
+    results = []
+    for size in sizes:
+        payload = '\n'.join(json.dumps({'user_name': seeded_user_name(i), 'name': f"Imported {i}",
+                                        'email': f"imported_{i}@example.com.invalid"}) for i in range(size))
+        event = {'format': 'jsonl', 'payload': payload}
+        results.append(measure('users.bulkImport', 'warm', lambda e=event: user_import.handler(e, None), 1,
+                               rows=size, setup=lambda s=size: seed_users(s // 2)))
+    return results
+
+
+def scaling_cases(sizes: list[int], iterations: int) -> list[BenchmarkResult]:
+    results = []
+    for size in sizes:
+        seed_users(size)
+        targets = [seeded_user_name(random.randrange(size)) for _ in range(iterations)] if size else [IDENTITY]
+        target_iter = itertools.cycle(targets)
+
+        def get_user():
+            users.handler(appsync_event('getUser', {'userName': next(target_iter)}), None)
+
+        def get_user_batch():
+            users.handler([appsync_event('getUser', {'userName': next(target_iter)}) for _ in range(BATCH_SIZE)], None)
+
+        results.append(measure('users.getUser', 'warm', get_user, iterations, rows=size, warmup=5))
+        results.append(measure('users.getUser_batch', 'warm', get_user_batch, iterations, rows=size, warmup=5))
+        for limit in LIST_PAGE_SIZES:
+            def list_users(limit=limit):
+                users.handler(appsync_event('listUsers', {'after': next(target_iter), 'limit': limit}), None)
+            results.append(measure(f"users.listUsers_{limit}", 'warm', list_users, iterations, rows=size, warmup=5))
+    return results
@@ -0,0 +1,113 @@
+"""Timing, result recording and comparison helpers shared by the benchmark cases."""
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from typing import Callable
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    scenario: str
+    rows: int = None
+    iterations: int = 0
+    stats_us: dict = field(default_factory=dict)
+
+
+@dataclass
+class BenchmarkRun:
+    meta: dict
+    results: list[BenchmarkResult] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps({'meta': self.meta, 'results': [asdict(r) for r in self.results]}, indent=2)
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile: the smallest value with at least ``pct`` percent of the values at or below it."""
+    if not sorted_values:
+        return 0.0
+    # Rounded so float error in the rank (e.g. 99.99 * 10000 / 100) does not move it by one
+    rank = math.ceil(round(pct * len(sorted_values) / 100, 9))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def summarize(samples_ns: list[int]) -> dict:
+    values = sorted(v / 1000 for v in samples_ns)
+    return {
+        'min': values[0],
+        'mean': statistics.fmean(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1],
+    }
+
+
+def measure(name: str, scenario: str, fn: Callable[[], object], iterations: int,  # pylint: disable=too-many-arguments
+            rows: int = None, setup: Callable[[], object] = None, warmup: int = 0) -> BenchmarkResult:
+    """Time ``fn`` ``iterations`` times. ``setup`` runs untimed before every call (e.g. resetting to a cold state)."""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+
+    result = BenchmarkResult(name=name, scenario=scenario, rows=rows, iterations=iterations,
+                             stats_us=summarize(samples))
+    print(f"{name:<32} {scenario:<6} {'' if rows is None else rows:>8} "
+          f"p50 {result.stats_us['p50']:10.1f} us  p99 {result.stats_us['p99']:10.1f} us")
+    return result
+
+
+def run_metadata(database: str) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': database,
+    }
+
+
+def load_run(path: str) -> dict:
+    with open(path, 'r', encoding='utf8') as file:
+        return json.load(file)
+
+
+def compare(base: dict, head: dict, metric: str = 'p50', threshold_pct: float = None) -> int:
+    """Print the relative change of ``metric`` per benchmark. Returns the number of regressions over threshold."""
+    def key(result):
+        return result['name'], result['scenario'], result['rows']
+
+    base_results = {key(r): r for r in base['results']}
+    regressions = 0
+    print(f"{'benchmark':<32} {'scenario':<8} {'rows':>8} {'base':>12} {'head':>12} {'change':>9}")
+    for result in head['results']:
+        previous = base_results.get(key(result))
+        if previous is None:
+            continue
+        old, new = previous['stats_us'][metric], result['stats_us'][metric]
+        change = (new - old) / old * 100 if old else 0.0
+        flag = ''
+        if threshold_pct is not None and change > threshold_pct:
+            regressions += 1
+            flag = '  REGRESSION'
+        rows = '' if result['rows'] is None else result['rows']
+        print(f"{result['name']:<32} {result['scenario']:<8} {rows:>8} {old:12.1f} {new:12.1f} {change:8.1f}%{flag}")
+    return regressions
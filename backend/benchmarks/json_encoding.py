@@ -0,0 +1,56 @@
+"""Cost of encoding a result payload with the legacy isinstance chain and with the type-dispatch encoder.
+
+Both spend nearly all their time in json.dumps itself, the registry is not faster than the chain it replaced.
+
+Run from the backend directory: ``PYTHONPATH=./:./lambdas python -m benchmarks.json_encoding``
+"""
+import decimal
+import json
+import timeit
+from datetime import datetime, date, timezone
+from enum import Enum
+from uuid import UUID, uuid4
+
+from lambdas.utils import dt_utils, serialization
+
+ROWS = 1000
+REPEAT = 5
+
+
+def legacy_default(value):  # pylint:disable=too-many-return-statements
+    """serialize_object as implemented before the type registry, kept here as the baseline."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return dt_utils.timestamp_to_iso(value)
+    if isinstance(value, date):
+        return dt_utils.date_to_iso(value)
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, dict)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def build_payload() -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [{'id': uuid4(), 'userName': f"user_{i}", 'created': now, 'birthday': now.date(),
+             'balance': decimal.Decimal(i) / 7} for i in range(ROWS)]
+
+
+def run():
+    payload = build_payload()
+    assert json.dumps(payload, default=legacy_default) == json.dumps(payload, default=serialization.convert)
+
+    legacy = min(timeit.repeat(lambda: json.dumps(payload, default=legacy_default),
+                               number=1, repeat=REPEAT)) / ROWS * 1_000_000
+    dispatch = min(timeit.repeat(lambda: json.dumps(payload, default=serialization.convert),
+                                 number=1, repeat=REPEAT)) / ROWS * 1_000_000
+    print(f"  legacy: {legacy:8.2f} us/row")
+    print(f"registry: {dispatch:8.2f} us/row   speedup {legacy / dispatch:5.1f}x")
+
+
+if __name__ == '__main__':
+    run()
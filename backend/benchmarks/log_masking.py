@@ -0,0 +1,52 @@
+"""Per-record cost of SensitiveLogFormatter masking with the legacy replace loop and the compiled matcher.
+
+Run from the backend directory: ``PYTHONPATH=./:./lambdas python -m benchmarks.log_masking``
+"""
+import logging
+import timeit
+from uuid import uuid4
+
+from lambdas.utils.common import SensitiveLogFormatter
+
+MASK_COUNTS = (1, 50, 500)
+RECORDS = 2000
+REPEAT = 5
+
+
+class LegacySensitiveLogFormatter(SensitiveLogFormatter):
+    """Masking as implemented before the compiled matcher, kept here as the baseline."""
+
+    def _filter(self, value: str, request_masks=None):
+        if value and isinstance(value, str):
+            for mask_value in self.mask_values:
+                value = value.replace(str(mask_value), '*****')
+        return value
+
+
+def build_records(mask_values: list) -> list[logging.LogRecord]:
+    records = []
+    for i in range(RECORDS):
+        message = f"Request {i} for user {uuid4()} with token {mask_values[i % len(mask_values)]} completed"
+        records.append(logging.LogRecord('benchmark', logging.INFO, __file__, 1, message, None, None))
+    return records
+
+
+def run():
+    base = logging.Formatter('%(asctime)s %(levelname)s (%(filename)s:%(lineno)d) - %(message)s')
+    for count in MASK_COUNTS:
+        mask_values = sorted((str(uuid4()) for _ in range(count)), key=len, reverse=True)
+        records = build_records(mask_values)
+        formatter = SensitiveLogFormatter(base, mask_values)
+        legacy_formatter = LegacySensitiveLogFormatter(base, mask_values)
+        assert all(legacy_formatter.format(r) == formatter.format(r) for r in records[:10])
+
+        legacy = min(timeit.repeat(lambda: [legacy_formatter.format(r) for r in records],
+                                   number=1, repeat=REPEAT)) / RECORDS * 1_000_000
+        compiled = min(timeit.repeat(lambda: [formatter.format(r) for r in records],
+                                     number=1, repeat=REPEAT)) / RECORDS * 1_000_000
+        print(f"{count:>4} masks: legacy {legacy:8.2f} us/record  compiled {compiled:8.2f} us/record  "
+              f"speedup {legacy / compiled:5.1f}x")
+
+
+if __name__ == '__main__':
+    run()
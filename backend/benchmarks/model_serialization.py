@@ -0,0 +1,102 @@
+"""Per-row cost of ``UserAccount.to_dict`` with the legacy per-call attribute walk and the compiled plans.
+
+Run from the backend directory: ``PYTHONPATH=./:./lambdas python -m benchmarks.model_serialization``
+"""
+import json
+import logging as log
+import timeit
+from uuid import uuid4
+
+from sqlalchemy.orm import QueryableAttribute
+
+from lambdas.models import UserAccount, _prepend_path
+from lambdas.utils import str_utils, common
+
+ROWS = 1000
+REPEAT = 5
+
+
+def legacy_model_to_dict(self, show: list = None,  # pylint: disable=too-many-locals,too-many-branches
+                         _hide: list = None,
+                         _path: str = None,
+                         camel_case: bool = True,
+                         serialize: bool = True):
+    """Serialization as implemented before the compiled plans, kept here as the baseline."""
+    show = show or []
+    _hide = _hide or []
+
+    hidden = self._hidden_fields if hasattr(self, "_hidden_fields") else []
+    default = self._default_fields if hasattr(self, "_default_fields") else []
+    default.extend(['id', 'created', 'modified'])
+
+    if not _path:
+        _path = getattr(self, '__tablename__').lower()
+        _hide[:] = [_prepend_path(_path, x) for x in _hide]
+        show[:] = [_prepend_path(_path, x) for x in show]
+
+    columns = getattr(self, '__table__').columns.keys()
+    relationships: list[str] = getattr(self, '__mapper__').relationships.keys()
+    properties = dir(self)
+
+    ret_data: dict = {}
+
+    for key in columns:
+        if key.startswith("_"):
+            continue
+        check = f"{_path}.{key}"
+        if check in _hide or key in hidden:
+            continue
+        if check in show or key in default:
+            result_key = str_utils.convert_snake_to_camel_case(key) if camel_case else key
+            value = getattr(self, key)
+            if serialize is True:
+                value = common.serialize_object(value)
+            ret_data[result_key] = value
+
+    for key in list(set(properties) - set(columns) - set(relationships)):
+        if key.startswith("_"):
+            continue
+        if not hasattr(self.__class__, key):
+            continue
+        attr = getattr(self.__class__, key)
+        if not isinstance(attr, (property, QueryableAttribute)):
+            continue
+        check = f"{_path}.{key}"
+        if check in _hide or key in hidden:
+            continue
+        if check in show or key in default:
+            result_key = str_utils.convert_snake_to_camel_case(key) if camel_case else key
+            try:
+                ret_data[result_key] = json.loads(json.dumps(getattr(self, key)))
+            except Exception:  # pylint: disable=broad-except
+                log.error("Could not serialise the field %s", check)
+
+    return ret_data
+
+
+def _show():
+    return ['user_name', 'name', 'email', 'organisation', 'organisation.name', 'organisation.display_name']
+
+
+def build_rows(count: int) -> list[UserAccount]:
+    return [UserAccount(id=uuid4(), user_name=f"user_{i}", name=f"User {i}", email=f"user_{i}@example.com.invalid")
+            for i in range(count)]
+
+
+def run():
+    rows = build_rows(ROWS)
+    assert all(legacy_model_to_dict(row, _show()) == row.to_dict() for row in rows[:10])
+
+    results = {}
+    for name, fn in (('legacy', lambda: [legacy_model_to_dict(row, _show()) for row in rows]),
+                     ('compiled', lambda: [row.to_dict() for row in rows])):
+        best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+        results[name] = best / ROWS * 1_000_000
+        print(f"{name:>10}: {results[name]:8.2f} us/row")
+
+    print(f"{'speedup':>10}: {results['legacy'] / results['compiled']:8.1f}x")
+    return results
+
+
+if __name__ == '__main__':
+    run()
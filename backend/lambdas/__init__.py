@@ -2,13 +2,17 @@ import json
 import logging
 import os
 
-from aws_xray_sdk.core import patch_all
-
 from lambdas.utils.common import LogManager, init_json_serialisation
 
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
 AWS_REGION = os.environ.get('AWS_REGION', None)
 ENVIRONMENT = os.environ.get('ENVIRONMENT', 'DEV').upper()
+# 'text' or 'json'
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+# Write the log records of an invocation in one go at its end instead of per record
+LOG_BUFFERED = os.environ.get('LOG_BUFFERED', 'false').lower() == 'true'
+# Share of invocations that write their DEBUG records, defaults to all of them when LOG_LEVEL is DEBUG
+LOG_DEBUG_SAMPLE_RATE = os.environ.get('LOG_DEBUG_SAMPLE_RATE', None)
 
 
 def init_lambda():
@@ -21,14 +25,24 @@ def init_lambda():
         log_level = logging.WARNING
 
     log_manager = LogManager()
-    log_manager.init_logging(log_level=log_level)
+    debug_sample_rate = float(LOG_DEBUG_SAMPLE_RATE) if LOG_DEBUG_SAMPLE_RATE is not None else None
+    log_manager.init_logging(log_level=log_level,
+                             log_format=LOG_FORMAT,
+                             buffered=LOG_BUFFERED,
+                             debug_sample_rate=debug_sample_rate)
 
     init_json_serialisation()
 
-    if AWS_REGION is not None:
+    if AWS_REGION is not None and is_tracing_enabled():
+        from aws_xray_sdk.core import patch_all  # pylint: disable=import-outside-toplevel
         patch_all()
 
 
+def is_tracing_enabled():
+    # Lambda only sets the daemon address when active tracing is on, skip importing the X-Ray SDK otherwise
+    return os.environ.get('AWS_XRAY_DAEMON_ADDRESS') is not None
+
+
 def is_dev():
     return ENVIRONMENT == 'DEV' or is_local()
 
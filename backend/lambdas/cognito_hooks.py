@@ -3,6 +3,8 @@ import logging as log
 from lambdas import init_lambda, ENVIRONMENT
 from lambdas.services import user_service
 from lambdas.services.db_manager import with_db_session
+from lambdas.utils import dt_utils
+from lambdas.utils.common import log_invocation
 
 init_lambda()
 
@@ -16,16 +18,23 @@ PREFIX = f"{ENVIRONMENT}_" if ENVIRONMENT is not None and ENVIRONMENT != '' else
 SUPPORTED_GROUPS = {'SYSADMIN'}
 
 
-@with_db_session
+@log_invocation
 def handler(event, _context):
     trigger_source: str = event['triggerSource']
-    if trigger_source.startswith(PRE_TOKEN_GEN_PREFIX):
-        return augment_token(event)
-    if trigger_source.startswith('PostConfirmation') or trigger_source.startswith('PostAuthentication'):
-        user_attributes = event['request']['userAttributes']
-        user_name = event['userName']
-        user_service.create_or_update_user(user_name, user_attributes)
+    with dt_utils.invocation_timings(), dt_utils.Timer(f"{trigger_source} trigger", level=log.INFO):
+        # Only the user sync triggers open a database session, token generation runs without DB or secret I/O
+        if trigger_source.startswith(PRE_TOKEN_GEN_PREFIX):
+            return augment_token(event)
+        if trigger_source.startswith(POST_CONFIRMATION_PREFIX) or trigger_source.startswith(POST_AUTH_PREFIX):
+            return sync_user(event)
         return event
+
+
+@with_db_session
+def sync_user(event):
+    user_attributes = event['request']['userAttributes']
+    user_name = event['userName']
+    user_service.create_or_update_user(user_name, user_attributes)
     return event
 
 
@@ -1,10 +1,183 @@
+import csv
+import io
+from typing import Iterable, Iterator
+from uuid import uuid4
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, insert, lambda_stmt, or_, select, text, \
+    update, exists, delete
+from sqlalchemy.dialects.postgresql import UUID, insert as postgresql_insert
+
 from lambdas.models import UserAccount
 from lambdas.services.db_manager import get_app_db
+from lambdas.utils import dt_utils
 
 db = get_app_db()
 
+IMPORT_CHUNK_SIZE = 10000
+
+# Session scoped staging table for bulk imports, dropped on commit
+user_import = Table(
+    'user_import', MetaData(),
+    Column('line', Integer, nullable=False),
+    Column('id', UUID(as_uuid=True), nullable=False),
+    Column('user_name', String, nullable=False),
+    Column('name', String, nullable=False),
+    Column('email', String, nullable=False),
+    prefixes=['TEMPORARY'],
+    postgresql_on_commit='DROP')
+
+_MERGE_IMPORT_SQL = text("""
+    WITH updated AS (
+        UPDATE user_account AS ua SET name = s.name, email = s.email
+        FROM user_import AS s
+        WHERE lower(ua.user_name) = lower(s.user_name)
+          AND (ua.name IS DISTINCT FROM s.name OR ua.email IS DISTINCT FROM s.email)
+        RETURNING 1
+    ), inserted AS (
+        INSERT INTO user_account (id, user_name, name, email)
+        SELECT s.id, s.user_name, s.name, s.email
+        FROM user_import AS s
+        WHERE NOT EXISTS (SELECT 1 FROM user_account AS ua WHERE lower(ua.user_name) = lower(s.user_name))
+        ON CONFLICT (lower(user_name)) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM inserted) AS inserted, (SELECT count(*) FROM updated) AS updated
+""")
 
+
+@dt_utils.phase('dao.find_user')
 def find_user(user_name) -> UserAccount:
-    return db.session.query(UserAccount)\
-        .filter(UserAccount.user_name == user_name)\
-        .one_or_none()
+    """Case-insensitive lookup, served by the lower(user_name) index. The statement is a lambda statement, so it
+    is built and compiled once and later calls only bind the name."""
+    user_name = user_name.lower()
+    stmt = lambda_stmt(lambda: select(UserAccount).where(func.lower(UserAccount.user_name) == user_name))
+    return db.session.execute(stmt).scalar_one_or_none()
+
+
+@dt_utils.phase('dao.find_users')
+def find_users(user_names) -> list[UserAccount]:
+    user_names = list({user_name.lower() for user_name in user_names})
+    if not user_names:
+        return []
+    stmt = lambda_stmt(lambda: select(UserAccount).where(func.lower(UserAccount.user_name).in_(user_names)))
+    return list(db.session.execute(stmt).scalars())
+
+
+def iter_users(after: str = None, limit: int = 100, batch_size: int = 500) -> Iterator[UserAccount]:
+    """Users ordered by user_name, starting after the given user_name (keyset pagination on the unique index).
+
+    Rows are streamed in ``batch_size`` chunks (a server side cursor on Postgres) so only one chunk is held at a time.
+    """
+    stmt = select(UserAccount).order_by(UserAccount.user_name).limit(limit)
+    if after is not None:
+        stmt = stmt.where(UserAccount.user_name > after)
+    yield from db.session.scalars(stmt.execution_options(yield_per=batch_size))
+
+
+@dt_utils.phase('dao.upsert_user')
+def upsert_user(user_name: str, name: str, email: str) -> bool:
+    """Insert or update the user with a single INSERT ... ON CONFLICT statement.
+
+    The update only fires when name or email actually differ, so unchanged rows are not rewritten.
+    Returns True when a row was inserted or updated.
+    """
+    return db.session.execute(_upsert_statement({'user_name': user_name, 'name': name, 'email': email})).rowcount > 0
+
+
+@dt_utils.phase('dao.upsert_users')
+def upsert_users(rows: list[dict]) -> int:
+    """Insert or update ``user_name, name, email`` rows with one multi-row INSERT ... ON CONFLICT statement.
+
+    User names must be unique (case-insensitively) within ``rows``. Returns the number of inserted or updated rows.
+    """
+    if not rows:
+        return 0
+    return db.session.execute(_upsert_statement([{'id': uuid4()} | row for row in rows])).rowcount
+
+
+@dt_utils.phase('dao.delete_users')
+def delete_users(user_names) -> int:
+    user_names = list({user_name.lower() for user_name in user_names})
+    if not user_names:
+        return 0
+    return db.session.execute(delete(UserAccount).where(func.lower(UserAccount.user_name).in_(user_names))).rowcount
+
+
+def _upsert_statement(values):
+    stmt = _insert_for_dialect()(UserAccount).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=[func.lower(UserAccount.user_name)],
+        set_={'name': stmt.excluded.name, 'email': stmt.excluded.email},
+        where=or_(UserAccount.name.is_distinct_from(stmt.excluded.name),
+                  UserAccount.email.is_distinct_from(stmt.excluded.email)))
+
+
+def _insert_for_dialect():
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # Only the unit tests and benchmarks run on SQLite
+        from sqlalchemy.dialects.sqlite import insert  # pylint: disable=import-outside-toplevel
+        return insert
+    return postgresql_insert
+
+
+def create_import_table():
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        # No ON COMMIT DROP, clear what a failed import left on this connection
+        user_import.drop(connection, checkfirst=True)
+    user_import.create(connection)
+
+
+def stage_import_rows(rows: Iterable[dict]) -> int:
+    """Load ``line, id, user_name, name, email`` rows into the staging table in chunks, with COPY on Postgres.
+    Returns the number of staged rows."""
+    staged = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            staged += _stage_chunk(chunk)
+            chunk = []
+    if chunk:
+        staged += _stage_chunk(chunk)
+    return staged
+
+
+def _stage_chunk(rows: list) -> int:
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        connection.execute(insert(user_import), rows)
+        return len(rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((row['line'], row['id'], row['user_name'], row['name'], row['email']))
+    buffer.seek(0)
+    with connection.connection.dbapi_connection.cursor() as cursor:
+        cursor.copy_expert('COPY user_import (line, id, user_name, name, email) FROM STDIN WITH (FORMAT csv)', buffer)
+    return len(rows)
+
+
+@dt_utils.phase('dao.merge_import_rows')
+def merge_import_rows() -> tuple[int, int]:
+    """Merge the staged rows into user_account, matching user names case-insensitively.
+    Existing users are only rewritten when name or email differ. Returns the (inserted, updated) counts."""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        row = connection.execute(_MERGE_IMPORT_SQL).one()
+        return row.inserted, row.updated
+
+    # Stand-in for local databases without data modifying CTEs, same result in two statements
+    updated = connection.execute(
+        update(UserAccount)
+        .where(func.lower(UserAccount.user_name) == func.lower(user_import.c.user_name),
+               or_(UserAccount.name.is_distinct_from(user_import.c.name),
+                   UserAccount.email.is_distinct_from(user_import.c.email)))
+        .values(name=user_import.c.name, email=user_import.c.email)).rowcount
+    new_rows = select(user_import.c.id, user_import.c.user_name, user_import.c.name, user_import.c.email)\
+        .where(~exists().where(func.lower(UserAccount.user_name) == func.lower(user_import.c.user_name)))
+    inserted = connection.execute(
+        insert(UserAccount).from_select(['id', 'user_name', 'name', 'email'], new_rows)).rowcount
+    user_import.drop(connection)
+    return inserted, updated
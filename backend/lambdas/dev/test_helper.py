@@ -1,18 +1,38 @@
 import logging as log
 import os
-
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from lambdas import init_lambda
+from lambdas.services import user_service
 from lambdas.services.db_manager import with_db_session
 from lambdas.utils import validators
-from services.user_service import delete_user
-
-aws_client = boto3.client(
-    "cognito-idp", region_name=os.environ.get("AWS_REGION"))
+from lambdas.utils.common import log_invocation
 
 init_lambda()
 
+# Parallel Cognito admin calls for the batch actions
+PROVISIONING_CONCURRENCY = int(os.environ.get('PROVISIONING_CONCURRENCY', '8'))
+# Attempts per Cognito call, throttled calls are retried with adaptive client side rate limiting
+COGNITO_MAX_ATTEMPTS = int(os.environ.get('COGNITO_MAX_ATTEMPTS', '10'))
+
+STATUS_CREATED = 'Created'
+STATUS_EXISTS = 'Exists'
+STATUS_DELETED = 'Deleted'
+STATUS_NOT_FOUND = 'NotFound'
+STATUS_FAILED = 'Failed'
+
+
+@lru_cache(maxsize=None)
+def get_aws_client():
+    import boto3  # pylint: disable=import-outside-toplevel
+    from botocore.config import Config  # pylint: disable=import-outside-toplevel
+    config = Config(retries={'mode': 'adaptive', 'max_attempts': COGNITO_MAX_ATTEMPTS},
+                    max_pool_connections=PROVISIONING_CONCURRENCY)
+    # COGNITO_ENDPOINT_URL points the client to a local Cognito stand-in
+    return boto3.client("cognito-idp", region_name=os.environ.get("AWS_REGION"),
+                        endpoint_url=os.environ.get("COGNITO_ENDPOINT_URL"), config=config)
+
 
 def get_aws_list(values: list[str]):
     result = ','.join(values)
@@ -22,6 +42,7 @@ def get_aws_list(values: list[str]):
 def create_user(username, password, email, groups: list[str]):
     user_pool_id = os.environ.get("USERPOOL_ID")
     client_id = os.environ.get("CLIENT_ID")
+    aws_client = get_aws_client()
     aws_client.admin_create_user(
         UserPoolId=user_pool_id,
         Username=username,
@@ -45,12 +66,56 @@ def create_user(username, password, email, groups: list[str]):
     return {'username': username, 'status': 'Created', 'userPoolId': user_pool_id, 'clientId': client_id}
 
 
+def create_users(users: list[dict]) -> list[dict]:
+    """Create the Cognito users concurrently and write the user_account rows of the created or already existing
+    ones with one statement. Returns a status per user, in request order."""
+    with ThreadPoolExecutor(max_workers=PROVISIONING_CONCURRENCY) as executor:
+        results = list(executor.map(_create_cognito_user, users))
+
+    user_service.create_or_update_users([
+        {'user_name': user['username'], 'name': user.get('name') or user['username'], 'email': user['email']}
+        for user, result in zip(users, results) if result['status'] != STATUS_FAILED])
+    return results
+
+
+def delete_users(usernames: list[str]) -> list[dict]:
+    with ThreadPoolExecutor(max_workers=PROVISIONING_CONCURRENCY) as executor:
+        results = list(executor.map(_delete_cognito_user, usernames))
+
+    user_service.delete_users([result['username'] for result in results if result['status'] != STATUS_FAILED])
+    return results
+
+
+def _create_cognito_user(user: dict) -> dict:
+    username = user.get('username')
+    try:
+        create_user(username=username, password=user['password'], email=user['email'], groups=user.get('groups', []))
+        return {'username': username, 'status': STATUS_CREATED}
+    except get_aws_client().exceptions.UsernameExistsException:
+        return {'username': username, 'status': STATUS_EXISTS}
+    except Exception as e:  # pylint: disable=broad-except
+        log.warning("Creating user %s failed: %s", username, e)
+        return {'username': username, 'status': STATUS_FAILED, 'error': str(e)}
+
+
+def _delete_cognito_user(username: str) -> dict:
+    try:
+        get_aws_client().admin_delete_user(UserPoolId=os.environ.get("USERPOOL_ID"), Username=username)
+        return {'username': username, 'status': STATUS_DELETED}
+    except get_aws_client().exceptions.UserNotFoundException:
+        return {'username': username, 'status': STATUS_NOT_FOUND}
+    except Exception as e:  # pylint: disable=broad-except
+        log.warning("Deleting user %s failed: %s", username, e)
+        return {'username': username, 'status': STATUS_FAILED, 'error': str(e)}
+
+
+@log_invocation(mask_fields=('password',))
 @with_db_session
 def handler(event, _context):
     action = validators.get_event_value(
         event,
         "action",
-        allowed_values=["create_user", "delete_user"]
+        allowed_values=["create_user", "delete_user", "create_users", "delete_users"]
     )
 
     if action == "create_user":
@@ -67,11 +132,23 @@ def handler(event, _context):
     if action == "delete_user":
         username = validators.get_event_value(event, "username")
         log.debug("deleting user %s", username)
-        aws_client.admin_delete_user(
+        get_aws_client().admin_delete_user(
             UserPoolId=os.environ.get("USERPOOL_ID"),
             Username=username,
         )
-        delete_user(username)
+        user_service.delete_user(username)
         return "User deleted"
 
+    if action == "create_users":
+        users = validators.get_event_value(event, "users")
+        log.debug("creating %s users", len(users))
+        return {'userPoolId': os.environ.get("USERPOOL_ID"),
+                'clientId': os.environ.get("CLIENT_ID"),
+                'users': create_users(users)}
+
+    if action == "delete_users":
+        usernames = validators.get_event_value(event, "usernames")
+        log.debug("deleting %s users", len(usernames))
+        return {'users': delete_users(usernames)}
+
     raise Exception("Unknown action")
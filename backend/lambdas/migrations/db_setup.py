@@ -1,16 +1,45 @@
 import json
 import logging as log
+import re
 import sys
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 
 from lambdas import init_lambda
 from lambdas.services import secrets_service
 from lambdas.services.db_manager import DbManager
+from lambdas.utils import validators
+from lambdas.utils.common import log_invocation
+from lambdas.utils.validators import ValidationException
 
 init_lambda()
 
+# Unquoted identifiers only, PostgreSQL folds them to lower case
+IDENTIFIER_PATTERN = re.compile(r'^[a-z_][a-z0-9_]{0,62}$')
 
+STATE_PRESENT = 'present'
+STATE_ABSENT = 'absent'
+STATES = (STATE_PRESENT, STATE_ABSENT)
+
+# Steps are applied in this order: owners exist before their databases are created, databases are dropped before
+# their owners
+STEP_CREATE_ROLE = 'create-role'
+STEP_CREATE_DATABASE = 'create-database'
+STEP_ALTER_OWNER = 'alter-owner'
+STEP_DROP_DATABASE = 'drop-database'
+STEP_DROP_ROLE = 'drop-role'
+STEP_ORDER = (STEP_CREATE_ROLE, STEP_CREATE_DATABASE, STEP_ALTER_OWNER, STEP_DROP_DATABASE, STEP_DROP_ROLE)
+
+CATALOG_QUERY = text("""
+    SELECT 'role' AS kind, rolname AS name, NULL AS owner
+    FROM pg_catalog.pg_roles WHERE rolname IN :roles
+    UNION ALL
+    SELECT 'database', lower(datname), pg_catalog.pg_get_userbyid(datdba)
+    FROM pg_catalog.pg_database WHERE lower(datname) IN :databases""").bindparams(
+    bindparam('roles', expanding=True), bindparam('databases', expanding=True))
+
+
+@log_invocation(mask_fields=('password',))
 def handler(event, _context):
     return setup_db(event)
 
@@ -30,9 +59,16 @@ def setup_db(event):
                     return drop_db(event, db)
                 if action == "drop-user":
                     return drop_user(event, db)
+                if action == "plan":
+                    return plan_setup(event, db)
+                if action == "apply":
+                    return apply_setup(event, db)
 
             return {'success': False,
-                    'message': "Unknown action. Valid actions are 'create', 'drop-db' and 'drop-user'"}
+                    'message': "Unknown action. "
+                               "Valid actions are 'create', 'drop-db', 'drop-user', 'plan' and 'apply'"}
+    except ValidationException as e:
+        return {'success': False, 'message': str(e)}
     except Exception:  # pylint: disable=broad-except
         message = f"setup database failed! Action {action}"
         log.exception(message)
@@ -131,6 +167,166 @@ def create_data_base(db_name: str, owner: str, encoding: str, db):
     db.session.commit()
 
 
+def identifier(field_name: str, value) -> str:
+    validators.raise_not_defined(field_name, value)
+    name = str(value).lower()
+    if IDENTIFIER_PATTERN.match(name) is None:
+        raise ValidationException(f"{field_name} '{value}' is not a valid identifier")
+    return name
+
+
+def get_state(spec: dict) -> str:
+    state = spec.get('state', STATE_PRESENT)
+    if state not in STATES:
+        raise ValidationException(f"Field 'state' value {state} is not one of {list(STATES)}")
+    return state
+
+
+def parse_spec(event) -> tuple:
+    """Desired roles and databases of a plan/apply payload::
+
+        {"roles": [{"name": "tenant_a", "password": "..."},
+                   {"secret": "db-app-secret"},
+                   {"name": "old_tenant", "state": "absent"}],
+         "databases": [{"name": "tenant_a", "owner": "tenant_a", "encoding": "en_US.UTF8"}]}
+
+    A role can take its name and password from a secret instead.
+    """
+    roles = {}
+    for role in event.get('roles', None) or []:
+        role = dict(role)
+        if role.get('secret', None) is not None:
+            secret = secrets_service.get_secret_value(role['secret'], result_type=dict)
+            role.setdefault('name', secret['username'])
+            role.setdefault('password', secret['password'])
+        name = identifier('Role name', role.get('name', None))
+        state = get_state(role)
+        if state == STATE_PRESENT:
+            validators.raise_not_defined(f"Password of role {name}", role.get('password', None))
+        roles[name] = {'state': state, 'password': role.get('password', None)}
+
+    databases = {}
+    for database in event.get('databases', None) or []:
+        name = identifier('Database name', database.get('name', None))
+        state = get_state(database)
+        owner = identifier(f"Owner of database {name}", database.get('owner', None)) \
+            if state == STATE_PRESENT else None
+        databases[name] = {'state': state, 'owner': owner, 'encoding': database.get('encoding', 'en_US.UTF8')}
+
+    if not roles and not databases:
+        raise ValidationException("Payload does not define any roles or databases")
+    return roles, databases
+
+
+def read_catalog(roles, databases, connection) -> tuple:
+    """Existing roles and the owners of the existing databases among the requested ones, in one query."""
+    existing_roles = set()
+    existing_databases = {}
+    for kind, name, owner in connection.execute(CATALOG_QUERY, {'roles': list(roles), 'databases': list(databases)}):
+        if kind == 'role':
+            existing_roles.add(name)
+        else:
+            existing_databases[name] = owner
+    return existing_roles, existing_databases
+
+
+def build_plan(roles, databases, existing_roles, existing_databases) -> tuple:
+    """Steps that bring the catalog to the requested state, and the names that already are in it."""
+    steps = []
+    unchanged = {'roles': [], 'databases': []}
+    for name, role in roles.items():
+        if role['state'] == STATE_PRESENT and name not in existing_roles:
+            steps.append({'step': STEP_CREATE_ROLE, 'name': name})
+        elif role['state'] == STATE_ABSENT and name in existing_roles:
+            steps.append({'step': STEP_DROP_ROLE, 'name': name})
+        else:
+            unchanged['roles'].append(name)
+
+    for name, database in databases.items():
+        owner = existing_databases.get(name, None)
+        if database['state'] == STATE_ABSENT:
+            if name in existing_databases:
+                steps.append({'step': STEP_DROP_DATABASE, 'name': name})
+            else:
+                unchanged['databases'].append(name)
+        elif name not in existing_databases:
+            steps.append({'step': STEP_CREATE_DATABASE, 'name': name, 'owner': database['owner']})
+        elif owner != database['owner']:
+            steps.append({'step': STEP_ALTER_OWNER, 'name': name, 'owner': database['owner'], 'previousOwner': owner})
+        else:
+            unchanged['databases'].append(name)
+
+    steps.sort(key=lambda step: STEP_ORDER.index(step['step']))
+    return steps, unchanged
+
+
+def plan(event, connection) -> tuple:
+    roles, databases = parse_spec(event)
+    existing_roles, existing_databases = read_catalog(roles, databases, connection)
+    steps, unchanged = build_plan(roles, databases, existing_roles, existing_databases)
+    return roles, databases, steps, unchanged
+
+
+def plan_setup(event, db):
+    _, _, steps, unchanged = plan(event, db.session.connection())
+    return {'success': True, 'message': f"{len(steps)} steps planned", 'steps': steps, 'unchanged': unchanged}
+
+
+def apply_step(step: dict, roles: dict, databases: dict, connection, granted: set,  # pylint: disable=too-many-arguments
+               master_user: str):
+    name = step['name']
+    if step['step'] == STEP_CREATE_ROLE:
+        connection.execute(text(f"CREATE ROLE {name} LOGIN PASSWORD :password"),
+                           {'password': roles[name]['password']})
+    elif step['step'] == STEP_DROP_ROLE:
+        connection.execute(text(f"DROP ROLE {name}"))
+    elif step['step'] == STEP_DROP_DATABASE:
+        connection.execute(text("""
+            SELECT pg_terminate_backend(pg_stat_activity.pid)
+            FROM pg_stat_activity
+            WHERE pg_stat_activity.datname = :database_name
+            AND pid <> pg_backend_pid()"""), {'database_name': name})
+        connection.execute(text(f"DROP DATABASE {name}"))
+    else:
+        owner = step['owner']
+        # The master user has to be a member of the owner role to hand a database over to it
+        if owner not in granted:
+            connection.execute(text(f"GRANT {owner} TO {master_user}"))
+            granted.add(owner)
+        if step['step'] == STEP_ALTER_OWNER:
+            connection.execute(text(f"ALTER DATABASE {name} OWNER TO {owner}"))
+        else:
+            connection.execute(text(f"CREATE DATABASE {name} "
+                                    f"WITH OWNER={owner} "
+                                    f"TEMPLATE=template0 "
+                                    f"ENCODING=:encoding "
+                                    f"LC_COLLATE=:collate "
+                                    f"LC_CTYPE=:ctype"),
+                               {'encoding': 'UTF8',
+                                'collate': databases[name]['encoding'],
+                                'ctype': databases[name]['encoding']})
+
+
+def apply_setup(event, db):
+    """Plans and applies the payload on the one AUTOCOMMIT connection. Stops at the first failing step, the result
+    lists the steps applied before it."""
+    connection = db.session.connection()
+    roles, databases, steps, unchanged = plan(event, connection)
+    applied = []
+    granted = set()
+    for step in steps:
+        log.info("Applying %s %s", step['step'], step['name'])
+        try:
+            apply_step(step, roles, databases, connection, granted, db.username)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Applying %s %s failed", step['step'], step['name'])
+            return {'success': False, 'message': f"Applying {step['step']} {step['name']} failed",
+                    'applied': applied, 'failed': step, 'skipped': steps[len(applied) + 1:], 'unchanged': unchanged}
+        applied.append(step)
+
+    return {'success': True, 'message': f"{len(applied)} steps applied", 'applied': applied, 'unchanged': unchanged}
+
+
 if __name__ == "__main__":
     payload = json.loads(sys.argv[1])
     response = handler(event=payload, _context=None)
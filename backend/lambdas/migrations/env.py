@@ -12,7 +12,9 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# The migration Lambda keeps its own logging configuration.
+if config.attributes.get('configure_logger', True):
+    fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -59,7 +61,19 @@ def run_migrations_online():
     In this scenario we need to create an Engine
     and associate a connection with the context.
 
+    A connection passed in ``config.attributes['connection']`` is used as is. Each revision is committed on its
+    own unless the caller already opened a transaction on it (dry runs).
+
     """
+    connection = config.attributes.get('connection', None)
+    if connection is not None:
+        context.configure(
+            connection=connection, target_metadata=target_metadata, transaction_per_migration=True
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     secret_json = secrets_service.get_secret_value('db-app-secret')
     secret = json.loads(secret_json)
     url = db_manager.get_db_url(secret, 'example')
@@ -74,7 +88,7 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, transaction_per_migration=True
         )
 
         with context.begin_transaction():
@@ -0,0 +1,229 @@
+"""Operations for migrating large tables while the application keeps writing to them.
+
+Plain Alembic operations run inside the migration transaction and wait for their locks without a limit, so DDL that
+queues behind a long transaction blocks every later writer of the table (e.g. the PostAuthentication hook updating
+user_account). These helpers bound the lock wait and retry, build indexes concurrently outside the transaction and
+backfill in small committed batches.
+
+With ``dry_run`` set in the Alembic config attributes the helpers only record the number of rows they would touch in
+``config.attributes['estimates']`` and change nothing.
+"""
+import json
+import logging as log
+import os
+import time
+from typing import Callable, Sequence
+
+from alembic import op
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError
+
+LOCK_TIMEOUT = os.environ.get('MIGRATION_LOCK_TIMEOUT', '2s')
+LOCK_RETRIES = int(os.environ.get('MIGRATION_LOCK_RETRIES', '10'))
+# Seconds, multiplied by the attempt number
+LOCK_RETRY_DELAY = float(os.environ.get('MIGRATION_LOCK_RETRY_DELAY', '1.0'))
+BACKFILL_BATCH_SIZE = int(os.environ.get('MIGRATION_BACKFILL_BATCH_SIZE', '1000'))
+# Seconds between backfill batches, leaves room for the application's writes and for replication to catch up
+BACKFILL_PAUSE = float(os.environ.get('MIGRATION_BACKFILL_PAUSE', '0.1'))
+
+# lock_not_available, raised when lock_timeout expires
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def _attributes() -> dict:
+    config = op.get_context().config
+    return config.attributes if config is not None else {}
+
+
+def is_dry_run() -> bool:
+    return bool(_attributes().get('dry_run', False))
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def is_lock_timeout(error: Exception) -> bool:
+    return isinstance(error, OperationalError) and getattr(error.orig, 'pgcode', None) == LOCK_NOT_AVAILABLE
+
+
+def estimate_rows(table: str, where: str = None) -> int:
+    """Number of rows of ``table`` matching ``where``, from the planner's estimate on PostgreSQL so large tables are
+    not scanned."""
+    connection = op.get_bind()
+    condition = f" WHERE {where}" if where else ""
+    if connection.dialect.name != 'postgresql':
+        return connection.execute(text(f"SELECT count(*) FROM {table}{condition}")).scalar_one()
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table}{condition}")).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def record_estimate(operation: str, table: str, rows: int, **details):
+    estimate = {'operation': operation, 'table': table, 'rows': rows, **details}
+    log.info("Dry run: %s on %s would touch about %s rows", operation, table, rows)
+    _attributes().setdefault('estimates', []).append(estimate)
+
+
+def check_unique(table: str, expression: str, sample_size: int = 10):
+    """Abort before building a unique index on ``expression`` while rows of ``table`` share a value of it.
+
+    A concurrent unique build over duplicates fails only after scanning the table and leaves an INVALID index behind,
+    so the duplicates are counted first. A dry run records them instead.
+    """
+    connection = op.get_bind()
+    duplicates = f"SELECT {expression} AS value, count(*) AS total FROM {table} GROUP BY {expression} " \
+                 "HAVING count(*) > 1"
+    count = connection.execute(text(f"SELECT count(*) FROM ({duplicates}) AS duplicates")).scalar_one()
+    if not count:
+        return
+    sample = connection.execute(text(f"{duplicates} ORDER BY 1 LIMIT :limit"), {'limit': sample_size}).all()
+    if is_dry_run():
+        record_estimate('duplicates', table, count, expression=expression)
+        return
+    raise RuntimeError(f"{count} values of {expression} occur in more than one row of {table}, merge or rename "
+                       f"these rows before migrating: {', '.join(f'{value} ({rows} rows)' for value, rows in sample)}")
+
+
+def _in_transaction(connection) -> bool:
+    # Inside an autocommit block the connection still reports a transaction, but the driver commits each statement
+    return connection.in_transaction() and connection.get_execution_options().get('isolation_level') != 'AUTOCOMMIT'
+
+
+def _set_lock_timeout(connection, value: str):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("SELECT set_config('lock_timeout', :value, false)"), {'value': value})
+
+
+def _reset_lock_timeout(connection):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("RESET lock_timeout"))
+
+
+def run_with_lock_timeout(operation: Callable, table: str,
+                          lock_timeout: str = None, retries: int = None, retry_delay: float = None):
+    """Run ``operation`` (e.g. ``lambda: op.add_column(...)``) giving up on its locks after ``lock_timeout`` and
+    retrying, so it never holds up other sessions for longer than the timeout.
+
+    Inside the migration transaction each attempt runs in a savepoint, a timed out attempt is rolled back alone.
+    """
+    if is_dry_run():
+        record_estimate('lock', table, estimate_rows(table))
+        return
+
+    lock_timeout = lock_timeout or LOCK_TIMEOUT
+    retries = retries or LOCK_RETRIES
+    retry_delay = LOCK_RETRY_DELAY if retry_delay is None else retry_delay
+    connection = op.get_bind()
+    for attempt in range(1, retries + 1):
+        savepoint = connection.begin_nested() if _in_transaction(connection) else None
+        try:
+            _set_lock_timeout(connection, lock_timeout)
+            operation()
+        except OperationalError as e:
+            if savepoint is not None:
+                savepoint.rollback()
+            if not is_lock_timeout(e) or attempt == retries:
+                raise
+            log.warning("Lock on %s not acquired in %s (attempt %s of %s), retrying", table, lock_timeout,
+                        attempt, retries)
+            time.sleep(retry_delay * attempt)
+        else:
+            if savepoint is not None:
+                savepoint.commit()
+            return
+        finally:
+            _reset_lock_timeout(connection)
+
+
+def _is_invalid_index(index_name: str):
+    """True for an index left INVALID by a failed concurrent build, False for a valid one, None if it is missing."""
+    return op.get_bind().execute(text(
+        "SELECT NOT pg_index.indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+        "WHERE pg_class.relname = :name"), {'name': index_name}).scalar_one_or_none()
+
+
+def create_index_concurrently(index_name: str, table: str, columns: Sequence, unique: bool = False, **kwargs):
+    """CREATE INDEX CONCURRENTLY outside the migration transaction, writes continue while the index is built.
+
+    A build that fails (also on lock_timeout) leaves an invalid index behind, so every attempt first drops an
+    invalid index of the same name and the index is checked to be valid afterwards. The preceding operations of the
+    migration are committed when the build starts.
+    """
+    if is_dry_run():
+        record_estimate('create_index', table, estimate_rows(table), index=index_name)
+        return
+    if not _is_postgres():
+        op.create_index(index_name, table, columns, unique=unique, **kwargs)
+        return
+
+    def build():
+        if _is_invalid_index(index_name):
+            log.warning("Dropping invalid index %s left by an earlier build", index_name)
+            op.drop_index(index_name, table_name=table, postgresql_concurrently=True)
+        op.create_index(index_name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True,
+                        **kwargs)
+
+    with op.get_context().autocommit_block():
+        run_with_lock_timeout(build, table)
+        if _is_invalid_index(index_name):
+            raise RuntimeError(f"Index {index_name} on {table} is invalid after the build")
+
+
+def drop_index_concurrently(index_name: str, table: str):
+    if is_dry_run():
+        record_estimate('drop_index', table, 0, index=index_name)
+        return
+    if not _is_postgres():
+        op.drop_index(index_name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        run_with_lock_timeout(lambda: op.drop_index(index_name, table_name=table, postgresql_concurrently=True,
+                                                    if_exists=True), table)
+
+
+def backfill(table: str, set_clause: str, where: str, key: str = 'id',
+             batch_size: int = None, pause: float = None) -> int:
+    """``UPDATE table SET set_clause WHERE where`` in batches of ``batch_size`` rows walked in ``key`` order.
+
+    On PostgreSQL each batch is committed on its own so row locks are held for one batch only. Returns the number
+    of rows updated.
+    """
+    if is_dry_run():
+        record_estimate('backfill', table, estimate_rows(table, where))
+        return 0
+
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    pause = BACKFILL_PAUSE if pause is None else pause
+    select_first = text(f"SELECT {key} FROM {table} WHERE {where} ORDER BY {key} LIMIT :limit")
+    select_next = text(f"SELECT {key} FROM {table} WHERE ({where}) AND {key} > :last ORDER BY {key} LIMIT :limit")
+    update = text(f"UPDATE {table} SET {set_clause} WHERE {key} IN :keys").bindparams(
+        bindparam('keys', expanding=True))
+
+    def run_batches():
+        total = 0
+        last = None
+        while True:
+            started = time.perf_counter()
+            connection = op.get_bind()
+            if last is None:
+                keys = connection.execute(select_first, {'limit': batch_size}).scalars().all()
+            else:
+                keys = connection.execute(select_next, {'last': last, 'limit': batch_size}).scalars().all()
+            if not keys:
+                return total
+            connection.execute(update, {'keys': keys})
+            total += len(keys)
+            last = keys[-1]
+            log.info("Backfilled %s rows of %s (%.0f ms)", total, table, (time.perf_counter() - started) * 1000)
+            if len(keys) < batch_size:
+                return total
+            if pause:
+                time.sleep(pause)
+
+    if not _is_postgres():
+        return run_batches()
+    with op.get_context().autocommit_block():
+        return run_batches()
@@ -1,20 +1,127 @@
 import logging as log
+import os
+from contextlib import contextmanager
 
-from alembic import command
-from alembic.config import Config
+from sqlalchemy import inspect, text
 
 from lambdas import init_lambda
+from lambdas.services.db_manager import get_app_db
+from lambdas.utils import dt_utils
+from lambdas.utils.common import log_invocation
 
 init_lambda()
 
+ALEMBIC_CONFIG = "lambdas/migrations/alembic.ini"
+# Script head written at build time by 'invoke migrationhead', checked against the scripts by the unit tests
+HEAD_FILE = os.path.join(os.path.dirname(__file__), 'alembic_head')
+# pg_advisory_xact_lock key, concurrent migration runs wait for each other
+MIGRATION_LOCK_ID = 721_094_355_001
 
-def handler(*_):
+
+def read_script_head() -> str:
+    with open(HEAD_FILE, mode='r', encoding='utf8') as file:
+        return file.read().strip()
+
+
+def get_script_head(alembic_cfg=None) -> str:
+    from alembic.config import Config  # pylint: disable=import-outside-toplevel
+    from alembic.script import ScriptDirectory  # pylint: disable=import-outside-toplevel
+
+    return ScriptDirectory.from_config(alembic_cfg or Config(ALEMBIC_CONFIG)).get_current_head()
+
+
+def get_database_revision(connection) -> str:
+    if not inspect(connection).has_table('alembic_version'):
+        return None
+    return connection.execute(text("SELECT version_num FROM alembic_version")).scalar_one_or_none()
+
+
+def upgrade(connection, dry_run: bool = False) -> list:
+    from alembic import command  # pylint: disable=import-outside-toplevel
+    from alembic.config import Config  # pylint: disable=import-outside-toplevel
+
+    alembic_cfg = Config(ALEMBIC_CONFIG)
+    # env.py runs on this connection and keeps the Lambda's logging configuration
+    alembic_cfg.attributes['connection'] = connection
+    alembic_cfg.attributes['configure_logger'] = False
+    alembic_cfg.attributes['dry_run'] = dry_run
+    command.upgrade(alembic_cfg, "head")
+    return alembic_cfg.attributes.get('estimates', [])
+
+
+def step(name: str) -> dt_utils.Timer:
+    return dt_utils.Timer(name, level=log.INFO, phase=name)
+
+
+@contextmanager
+def migration_lock(connection):
+    """Session level advisory lock, held across the per-revision commits. Concurrent runs wait for each other."""
+    if connection.dialect.name != 'postgresql':
+        yield
+        return
+
+    with step('acquire_lock'):
+        connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+        connection.commit()
     try:
-        log.info("Migrating the database schema")
+        yield
+    finally:
+        try:
+            connection.rollback()
+            connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+            connection.commit()
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Releasing the migration lock failed, discarding the connection")
+            connection.invalidate()
+
+
+def migrate(dry_run: bool = False) -> dict:
+    """Upgrade the database to the script head.
+
+    Returns without touching Alembic when alembic_version already matches the head. Otherwise the upgrade runs on
+    a dedicated connection holding an advisory lock, and the version is checked again once the lock is held. A dry
+    run executes the migrations in one transaction that is rolled back, and returns the row estimates recorded by
+    the helpers of lambdas.migrations.helpers.
+    """
+    with dt_utils.invocation_timings() as timings, get_app_db() as db:
+        def result(message: str, revision: str, **values) -> dict:
+            return {'success': True, 'message': message, 'revision': revision, **values,
+                    'timingsMs': {name: round(seconds * 1000, 1) for name, (seconds, _) in timings.phases.items()}}
+
+        with step('read_head'):
+            head = read_script_head()
+        with step('check_version'):
+            current = get_database_revision(db.session.connection())
+        db.session.rollback()
+        if current == head:
+            return result('Database is up to date', current)
 
-        alembic_cfg = Config("lambdas/migrations/alembic.ini")
-        command.upgrade(alembic_cfg, "head")
-        return {'success': True, 'message': 'OK'}
+        log.info("Migrating the database schema from %s to %s%s", current, head, " (dry run)" if dry_run else "")
+        with db.session.get_bind().connect() as connection, migration_lock(connection):
+            current = get_database_revision(connection)
+            if current == head:
+                return result('Database was migrated by a concurrent run', head)
+
+            if dry_run:
+                # Plain operations run inside the rolled back transaction, do not let them wait for locks
+                if connection.dialect.name == 'postgresql':
+                    connection.execute(text("SET LOCAL lock_timeout = '2s'"))
+                with step('upgrade'):
+                    estimates = upgrade(connection, dry_run=True)
+                connection.rollback()
+                return result('Dry run', current, estimates=estimates)
+
+            # Alembic commits each revision itself, so the helpers can leave the transaction for concurrent DDL
+            connection.commit()
+            with step('upgrade'):
+                upgrade(connection)
+        return result('OK', head)
+
+
+@log_invocation
+def handler(event, _):
+    try:
+        return migrate(dry_run=bool((event or {}).get('dryRun', False)))
 
     except Exception:  # pylint: disable=broad-except
         message = "Running database migration failed"
@@ -0,0 +1,28 @@
+"""unique lower(user_name) index, user names are unique case-insensitively
+
+Revision ID: 5c1d2e9b7a43
+Revises: 87a0fad42c8e
+Create Date: 2026-10-18 10:12:41.512306
+
+"""
+import sqlalchemy as sa
+
+from lambdas.migrations import helpers
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d2e9b7a43'
+down_revision = '87a0fad42c8e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # User names differing only by case have to be merged by hand, the migration stops before building the index
+    helpers.check_unique('user_account', 'lower(user_name)')
+    helpers.create_index_concurrently('ux_user_account_lower_user_name', 'user_account',
+                                      [sa.text('lower(user_name)')], unique=True)
+
+
+def downgrade():
+    helpers.drop_index_concurrently('ux_user_account_lower_user_name', 'user_account')
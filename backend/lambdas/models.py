@@ -1,12 +1,13 @@
 import json
 import logging as log
+from functools import partial
 from uuid import uuid4
 
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Index, String, event, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeMeta, declarative_base, QueryableAttribute
 
-from lambdas.utils import str_utils, common
+from lambdas.utils import str_utils, common, dt_utils
 
 Base: DeclarativeMeta = declarative_base()
 
@@ -23,117 +24,151 @@ def _prepend_path(path, field_name):
     return field_name
 
 
+class _SerializationPlan:
+    """Flat list of (attribute, output key, serializer) steps for one model class and show/hide selection."""
+
+    def __init__(self, steps: list):
+        self.steps = steps
+
+    def run(self, model, type_name: str = None) -> dict:
+        ret_data: dict = {'__typename': type_name} if type_name is not None else {}
+        for attribute, result_key, serializer in self.steps:
+            value = getattr(model, attribute)
+            if serializer is not None:
+                value = serializer(value)
+                if value is _SKIP:
+                    continue
+            ret_data[result_key] = value
+        return ret_data
+
+
+_SKIP = object()
+_PLANS: dict = {}
+
+
+def _get_plan(model_class, show: tuple, hide: tuple, path: str, camel_case: bool, serialize: bool):
+    plan_key = (model_class, show, hide, path, camel_case, serialize)
+    plan = _PLANS.get(plan_key)
+    if plan is None:
+        plan = _compile_plan(model_class, list(show), list(hide), path, camel_case, serialize)
+        _PLANS[plan_key] = plan
+    return plan
+
+
+def _serialize_nested(value, show: tuple, hide: tuple, path: str):
+    return _get_plan(type(value), show, hide, path, True, True).run(value)
+
+
+def _serialize_list(items, show: tuple, hide: tuple, path: str, is_query: bool):
+    if is_query and hasattr(items, "all"):
+        items = items.all()
+    return [_serialize_nested(item, show, hide, path) for item in items]
+
+
+def _serialize_relation(item, show: tuple, hide: tuple, path: str):
+    if item is None:
+        return None
+    return _serialize_nested(item, show, hide, path)
+
+
+def _serialize_property(value, show: tuple, hide: tuple, path: str, check: str):
+    if hasattr(value, "to_dict"):
+        return _serialize_nested(value, show, hide, path)
+    try:
+        return json.loads(json.dumps(value))
+    except Exception:  # pylint: disable=broad-except
+        log.error("Could not serialise the field %s", check)
+        return _SKIP
+
+
+def _compile_plan(model_class, show: list, hide: list,  # pylint: disable=too-many-arguments,too-many-locals
+                  path: str, camel_case: bool, serialize: bool) -> _SerializationPlan:
+    hidden = getattr(model_class, "_hidden_fields", [])
+    default = [*getattr(model_class, "_default_fields", []), 'id', 'created', 'modified']
+
+    if not path:
+        path = getattr(model_class, '__tablename__').lower()
+        hide = [_prepend_path(path, x) for x in hide]
+        show = [_prepend_path(path, x) for x in show]
+
+    mapper = getattr(model_class, '__mapper__')
+    columns = getattr(model_class, '__table__').columns.keys()
+    relationships: list[str] = mapper.relationships.keys()
+    steps = []
+
+    def included(key):
+        if key.startswith("_"):
+            return False
+        check = f"{path}.{key}"
+        if check in hide or key in hidden:
+            return False
+        return check in show or key in default
+
+    key_map = model_class.__dict__.get('_camel_case_keys', {})
+
+    def result_key_for(key):
+        if not camel_case:
+            return key
+        return key_map.get(key) or str_utils.convert_snake_to_camel_case(key)
+
+    for key in columns:
+        if included(key):
+            steps.append((key, result_key_for(key), common.serialize_object if serialize is True else None))
+
+    for key in relationships:
+        if not included(key):
+            continue
+        check = f"{path}.{key}"
+        hide.append(check)
+        child = (tuple(show), tuple(hide), f"{path}.{key.lower()}")
+        relation = mapper.relationships[key]
+        if relation.uselist:
+            serializer = partial(_serialize_list, *child, is_query=relation.query_class is not None)
+        elif relation.query_class is not None or relation.instrument_class is not None:
+            serializer = partial(_serialize_relation, *child)
+        else:
+            serializer = None
+        steps.append((key, result_key_for(key), serializer))
+
+    for key in sorted(set(dir(model_class)) - set(columns) - set(relationships)):
+        if not isinstance(getattr(model_class, key, None), (property, QueryableAttribute)):
+            continue
+        if included(key):
+            check = f"{path}.{key}"
+            serializer = partial(_serialize_property, show=tuple(show), hide=tuple(hide),
+                                 path=f"{path}.{key.lower()}", check=check)
+            steps.append((key, result_key_for(key), serializer))
+
+    return _SerializationPlan(steps)
+
+
 class DbModel(Base):
     __abstract__ = True
 
-    def model_to_dict(self, show: list = None,  # pylint: disable=too-many-locals,too-many-branches,too-many-statements
+    def model_to_dict(self, show: list = None,  # pylint: disable=too-many-arguments
                       _hide: list = None,
                       _path: str = None,
                       camel_case: bool = True,
                       serialize: bool = True,
                       type_name: str = None):
-        """Return a dictionary representation of this model."""
-
-        show = show or []
-        _hide = _hide or []
+        """Return a dictionary representation of this model.
 
-        hidden = self._hidden_fields if hasattr(self, "_hidden_fields") else []
-        default = self._default_fields if hasattr(self, "_default_fields") else []
-        default.extend(['id', 'created', 'modified'])
+        The attribute selection is compiled once per class and (show, hide, camel_case) combination and cached,
+        so repeated calls only walk a flat list of serialization steps.
+        """
+        plan = _get_plan(type(self), tuple(show or ()), tuple(_hide or ()), _path, camel_case, serialize)
+        if _path is not None:
+            return plan.run(self, type_name)
+        with dt_utils.phase('serialize'):
+            return plan.run(self, type_name)
 
-        if not _path:
-            _path = getattr(self, '__tablename__').lower()
-            _hide[:] = [_prepend_path(_path, x) for x in _hide]
-            show[:] = [_prepend_path(_path, x) for x in show]
 
-        columns = getattr(self, '__table__').columns.keys()
-        relationships: list[str] = getattr(self, '__mapper__').relationships.keys()
-        properties = dir(self)
-
-        ret_data: dict = {'__typename': type_name} if type_name is not None else {}
-
-        for key in columns:
-            if key.startswith("_"):
-                continue
-            check = f"{_path}.{key}"
-            if check in _hide or key in hidden:
-                continue
-            if check in show or key in default:
-                result_key = str_utils.convert_snake_to_camel_case(key) if camel_case else key
-                value = getattr(self, key)
-                if serialize is True:
-                    value = common.serialize_object(value)
-                ret_data[result_key] = value
-
-        for key in relationships:
-            if key.startswith("_"):
-                continue
-            check = f"{_path}.{key}"
-            if check in _hide or key in hidden:
-                continue
-            if check in show or key in default:
-                result_key: str = str_utils.convert_snake_to_camel_case(key) if camel_case else key
-                _hide.append(check)
-                is_list = getattr(self, '__mapper__').relationships[key].uselist
-                if is_list:
-                    items = getattr(self, key)
-                    if getattr(self, '__mapper__').relationships[key].query_class is not None:
-                        if hasattr(items, "all"):
-                            items = items.all()
-                    ret_data[result_key] = []
-                    for item in items:
-                        ret_data[result_key].append(
-                            item.model_to_dict(
-                                show=list(show),
-                                _hide=list(_hide),
-                                _path=f"{_path}.{key.lower()}"
-                            )
-                        )
-                else:
-                    relation = getattr(self, '__mapper__').relationships[key]
-                    if (
-                        relation.query_class is not None
-                        or relation.instrument_class is not None
-                    ):
-                        item = getattr(self, key)
-                        if item is not None:
-                            ret_data[result_key] = item.model_to_dict(
-                                show=list(show),
-                                _hide=list(_hide),
-                                _path=f"{_path}.{key.lower()}",
-                            )
-                        else:
-                            ret_data[result_key] = None
-                    else:
-                        ret_data[result_key] = getattr(self, key)
-
-        for key in list(set(properties) - set(columns) - set(relationships)):
-            if key.startswith("_"):
-                continue
-            if not hasattr(self.__class__, key):
-                continue
-            attr = getattr(self.__class__, key)
-            if not isinstance(attr, (property, QueryableAttribute)):
-                continue
-            check = f"{_path}.{key}"
-            if check in _hide or key in hidden:
-                continue
-            if check in show or key in default:
-                result_key = str_utils.convert_snake_to_camel_case(key) if camel_case else key
-                val = getattr(self, key)
-                if hasattr(val, "to_dict"):
-                    ret_data[result_key] = val.model_to_dict(
-                        show=list(show),
-                        _hide=list(_hide),
-                        _path=f"{_path}.{key.lower()}"
-                    )
-                else:
-                    try:
-                        ret_data[result_key] = json.loads(json.dumps(val))
-                    except Exception:  # pylint: disable=broad-except
-                        log.error("Could not serialise the field %s", check)
-
-        return ret_data
+@event.listens_for(DbModel, 'mapper_configured', propagate=True)
+def _build_camel_case_keys(mapper, model_class):
+    """Compute the camel case output key of every mapped attribute once, when the mapper is configured."""
+    model_class._camel_case_keys = {  # pylint: disable=protected-access
+        key: str_utils.convert_snake_to_camel_case(key) for key in mapper.all_orm_descriptors.keys()
+        if not key.startswith('_')}
 
 
 class UserAccount(DbModel):
@@ -143,6 +178,11 @@ class UserAccount(DbModel):
     name = Column(String, nullable=False)
     email = Column(String, nullable=False)
 
+    # User names are unique case-insensitively, upserts use this index as their conflict target
+    __table_args__ = (
+        Index('ux_user_account_lower_user_name', func.lower(user_name), unique=True),
+    )
+
     def to_dict(self, show: list = None):
         show = show if show is not None else ['user_name',
                                               'name',
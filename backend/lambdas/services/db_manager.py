@@ -1,16 +1,77 @@
 import logging as log
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
 from functools import wraps
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import NullPool, QueuePool
 
 from lambdas.services import secrets_service
+from lambdas.utils import dt_utils
 from lambdas.utils.common import Singleton, ServiceException
 
 
-def get_db_url(secret: dict, db_name: str) -> str:
+def get_db_url(secret: dict, db_name: str, host: str = None) -> str:
+    """URL of the database on ``host``, the secret's host (the writer) by default."""
+    if secret.get('engine') == 'sqlite':
+        # Local stand-in for tests and benchmarks, 'dbname' (or the host) is the database file path
+        return f"sqlite:///{host or secret.get('dbname', '')}"
     return f"postgresql+psycopg2://{secret['username']}:{secret['password']}@" \
-           f"{secret['host']}:{secret['port']}/{db_name}"
+           f"{host or secret['host']}:{secret['port']}/{db_name}"
+
+
+AUTHENTICATION_ERROR_CODES = ('28000', '28P01')
+
+POOL_MODE_SINGLE = 'single'
+POOL_MODE_NULL = 'null'
+POOL_MODE_QUEUE = 'queue'
+POOL_MODES = (POOL_MODE_SINGLE, POOL_MODE_NULL, POOL_MODE_QUEUE)
+
+# Seconds read-only sessions stay on the writer after the reader endpoint failed to connect
+READER_RETRY_INTERVAL = float(os.environ.get('DB_READER_RETRY_INTERVAL', '30'))
+
+
+def is_authentication_error(error: Exception) -> bool:
+    if getattr(error, 'pgcode', None) in AUTHENTICATION_ERROR_CODES:
+        return True
+    return 'password authentication failed' in str(error)
+
+
+def get_pool_options(pool_mode: str, pool_pre_ping: bool, pool_recycle: int) -> dict:
+    """Engine pool arguments for the given mode.
+
+    * ``single``: one persistent connection reused across invocations of a single-concurrency Lambda container.
+    * ``null``: no pooling, a connection per session. Use behind RDS Proxy or pgbouncer.
+    * ``queue``: bounded QueuePool for threaded use, sized by DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW.
+    """
+    if pool_mode == POOL_MODE_NULL:
+        return {'poolclass': NullPool}
+
+    options = {'poolclass': QueuePool,
+               'pool_pre_ping': pool_pre_ping,
+               'pool_recycle': pool_recycle,
+               'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '30'))}
+    if pool_mode == POOL_MODE_SINGLE:
+        return options | {'pool_size': 1, 'max_overflow': 0}
+    if pool_mode == POOL_MODE_QUEUE:
+        return options | {'pool_size': int(os.environ.get('DB_POOL_SIZE', '5')),
+                          'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW', '0'))}
+    raise ServiceException(f"Unknown pool mode '{pool_mode}'. Valid modes are {POOL_MODES}")
+
+
+@dataclass
+class PoolStats:
+    connects: int = 0
+    checkouts: int = 0
+    reconnects: int = 0
+    closed: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
 
 
 def get_app_db():
@@ -23,41 +84,205 @@ class DbManager(metaclass=Singleton):  # pylint: disable=too-many-instance-attri
     def __init__(self,  # pylint: disable=too-many-arguments
                  connection_secret,
                  db_name,
-                 pool_pre_ping=True,
-                 pool_recycle=300,
+                 pool_pre_ping=None,
+                 pool_recycle=None,
                  isolation_level=None,
-                 debug=False):
+                 debug=False,
+                 pool_mode=None,
+                 reader_host=None):
 
-        self.secret = secrets_service.get_secret_value(connection_secret, result_type=dict)
+        self.connection_secret = connection_secret
+        self._secret = None
         self.db_name = db_name
-        self.username = self.secret['username']
-        self.pool_pre_ping = pool_pre_ping
-        self.pool_recycle = pool_recycle
+        self.pool_mode = pool_mode or os.environ.get('DB_POOL_MODE', POOL_MODE_SINGLE).lower()
+        self.pool_pre_ping = pool_pre_ping if pool_pre_ping is not None \
+            else os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+        self.pool_recycle = pool_recycle if pool_recycle is not None \
+            else int(os.environ.get('DB_POOL_RECYCLE', '300'))
         self.isolation_level = isolation_level
         self.debug = debug
+        self._reader_host = reader_host or os.environ.get('DB_READER_HOST', None)
+        self.pool_stats = PoolStats()
+        self._replaced_connections = 0
         self._engine = None
+        self._reader_engine = None
+        self._session_factory = None
+        self._read_only_session_factory = None
+        self._fallback_session_factory = None
+        self._reader_unavailable_until = 0.0
         self.session: Session = None
 
-    def __enter__(self):
-        if self._engine is None:
-            self.__init_connection()
+    @property
+    def secret(self) -> dict:
+        # Resolved on first use so importing a handler does not fetch the secret
+        if self._secret is None:
+            self._secret = secrets_service.get_secret_value(self.connection_secret, result_type=dict)
+        return self._secret
 
-        session_object = sessionmaker(self._engine)
-        self.session = session_object(bind=self._engine)
-        return self
+    @property
+    def username(self) -> str:
+        return self.secret['username']
+
+    @property
+    def reader_host(self) -> str:
+        """Reader endpoint (DB_READER_HOST or the secret's 'readerHost'), None when reads go to the writer."""
+        return self._reader_host or self.secret.get('readerHost', None)
+
+    def __enter__(self):
+        return self.open_session(read_only=False)
 
     def __exit__(self, *args, **kwargs):
         self.session.close()
         self.session = None
 
+    @contextmanager
+    def session_scope(self, read_only: bool = False):
+        """``with db.session_scope(read_only=True):``, the context manager form of open_session."""
+        self.open_session(read_only=read_only)
+        try:
+            yield self
+        finally:
+            self.__exit__()
+
+    def reads_from_reader(self) -> bool:
+        """True while ``self.session`` reads from the reader endpoint, which lags the writer by the replica lag."""
+        return self.session is not None and self.session.info.get('reader', False)
+
+    @contextmanager
+    def writer_reads(self):
+        """``with db.writer_reads():`` runs the block on a read-only session on the writer in place of
+        ``self.session``, for reads that must see the latest commits. Objects loaded in the block are detached."""
+        session = self.session
+        self.session = self._fallback_session_factory()
+        try:
+            yield self
+        finally:
+            self.session.close()
+            self.session = session
+
+    def open_session(self, read_only: bool = False):
+        """Start ``self.session``. A read-only session runs READ ONLY transactions on the reader endpoint, or on the
+        writer while the reader is not configured or failed to connect within READER_RETRY_INTERVAL."""
+        with dt_utils.phase('session_open'):
+            if self._engine is None:
+                self.__init_connection()
+
+            if not read_only:
+                self.session = self._session_factory()
+            elif self._reader_engine is None or time.monotonic() < self._reader_unavailable_until:
+                self.session = self._fallback_session_factory()
+            else:
+                self.session = self._open_reader_session()
+        return self
+
+    def _open_reader_session(self) -> Session:
+        session = self._read_only_session_factory()
+        try:
+            # Connect now so an unavailable reader is noticed before the first query
+            session.connection()
+            session.info['reader'] = True
+            return session
+        except OperationalError:
+            session.close()
+            log.warning("Reader endpoint %s unavailable, using the writer for %s seconds", self.reader_host,
+                        READER_RETRY_INTERVAL, exc_info=True)
+            self._reader_unavailable_until = time.monotonic() + READER_RETRY_INTERVAL
+            return self._fallback_session_factory()
+
+    @dt_utils.phase('engine_init')
     def __init_connection(self):
-        self._engine = create_engine(
-            url=get_db_url(self.secret, self.db_name),
+        self._engine = self._create_engine(host=None)
+        self._session_factory = self._create_session_factory(self._engine)
+        # READ ONLY transactions on the writer, for read-only sessions without a reader
+        self._fallback_session_factory = self._create_session_factory(
+            self._engine.execution_options(postgresql_readonly=True))
+        if self.reader_host is not None:
+            self._reader_engine = self._create_engine(host=self.reader_host)
+            self._read_only_session_factory = self._create_session_factory(
+                self._reader_engine.execution_options(postgresql_readonly=True))
+
+    def _create_engine(self, host: str = None):
+        engine = create_engine(
+            url=get_db_url(self.secret, self.db_name, host),
             echo=self.debug,
             future=True,
-            pool_pre_ping=self.pool_pre_ping,
-            pool_recycle=self.pool_recycle,
-            isolation_level=self.isolation_level)
+            isolation_level=self.isolation_level,
+            **get_pool_options(self.pool_mode, self.pool_pre_ping, self.pool_recycle))
+
+        def connect(dialect, connection_record, cargs, cparams):
+            return self._connect(dialect, connection_record, cargs, cparams, host)
+
+        event.listen(engine, 'do_connect', connect)
+        event.listen(engine, 'connect', self._on_pool_connect)
+        event.listen(engine, 'checkout', self._on_pool_checkout)
+        event.listen(engine, 'close', self._on_pool_close)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'begin', _sqlite_begin)
+        return engine
+
+    @staticmethod
+    def _create_session_factory(bind) -> sessionmaker:
+        session_factory = sessionmaker(bind)
+        event.listen(session_factory, 'before_commit', _start_commit_timer)
+        event.listen(session_factory, 'after_commit', _stop_commit_timer)
+        # A failed commit never reaches after_commit, the rollback that follows stops its timer
+        event.listen(session_factory, 'after_rollback', _stop_commit_timer)
+        event.listen(session_factory, 'after_soft_rollback', _stop_commit_timer)
+        return session_factory
+
+    def _on_pool_connect(self, *_):
+        self.pool_stats.connects += 1
+        if self.pool_mode != POOL_MODE_NULL and self._replaced_connections > 0:
+            # A pooled connection was closed (recycle, failed pre-ping or disconnect) and is being replaced
+            self._replaced_connections -= 1
+            self.pool_stats.reconnects += 1
+
+    def _on_pool_checkout(self, *_):
+        self.pool_stats.checkouts += 1
+
+    def _on_pool_close(self, *_):
+        self.pool_stats.closed += 1
+        self._replaced_connections += 1
+
+    def _connect(self, dialect, _connection_record, cargs, cparams, host=None):  # pylint: disable=too-many-arguments
+        """Connect with the current (cached) credentials and retry once with a freshly fetched secret if the
+        database rejects them, which usually means the secret was rotated."""
+        if dialect.name != 'postgresql':
+            return None
+        self.__apply_secret(cparams, host)
+        try:
+            with dt_utils.phase('connect'):
+                return dialect.connect(*cargs, **cparams)
+        except dialect.loaded_dbapi.OperationalError as e:
+            if not is_authentication_error(e):
+                raise
+            log.warning("Database authentication failed, refreshing secret %s", self.connection_secret)
+            self.refresh_secret()
+            self.__apply_secret(cparams, host)
+            return dialect.connect(*cargs, **cparams)
+
+    def refresh_secret(self):
+        self._secret = secrets_service.get_secret_value(self.connection_secret, result_type=dict, force_refresh=True)
+
+    def __apply_secret(self, cparams: dict, host: str = None):
+        self._secret = secrets_service.get_secret_value(self.connection_secret, result_type=dict)
+        cparams.update(user=self.secret['username'],
+                       password=self.secret['password'],
+                       host=host or self.secret['host'],
+                       port=self.secret['port'])
+
+    def dispose(self):
+        """Close pooled connections and drop the engine, the next session starts from a cold container state."""
+        for engine in (self._engine, self._reader_engine):
+            if engine is not None:
+                engine.dispose()
+        self._engine = None
+        self._reader_engine = None
+        self._session_factory = None
+        self._read_only_session_factory = None
+        self._fallback_session_factory = None
+        self._reader_unavailable_until = 0.0
+        self._secret = None
 
     def destroy(self):
         if self.session is not None:
@@ -67,15 +292,43 @@ class DbManager(metaclass=Singleton):  # pylint: disable=too-many-instance-attri
             self.session: Session = None
 
         self._engine = None
+        self._reader_engine = None
+        self._session_factory = None
+        self._read_only_session_factory = None
+        self._fallback_session_factory = None
         DbManager._instances = {}
 
 
-def with_db_session(fn):
+def _sqlite_begin(connection):
+    # SQLite has no READ ONLY transactions, query_only rejects writes on the connections of read-only sessions
+    read_only = connection.get_execution_options().get('postgresql_readonly', False)
+    connection.connection.driver_connection.execute(f"PRAGMA query_only = {int(read_only)}")
+
+
+def _start_commit_timer(session: Session):
+    timer = dt_utils.phase('commit')
+    session.info['commit_timer'] = timer
+    timer.start()
+
+
+def _stop_commit_timer(session: Session, *_):
+    timer = session.info.pop('commit_timer', None)
+    if timer is not None:
+        timer.stop()
+
+
+def with_db_session(fn=None, *, read_only: bool = False):
+    """Run ``fn`` in a session of the app database, a read-only one on the reader endpoint with ``read_only``.
+    Use as ``@with_db_session`` or ``@with_db_session(read_only=True)``. The phases timed during the call are
+    written as one embedded metric line when METRICS_NAMESPACE is set."""
+    if fn is None:
+        return lambda function: with_db_session(function, read_only=read_only)
+
     db_manager = get_app_db()
 
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        with db_manager as db:
+        with dt_utils.invocation_timings(), db_manager.session_scope(read_only) as db:
             try:
                 return fn(*args, **kwargs)
             except ServiceException as e:
@@ -86,4 +339,3 @@ def with_db_session(fn):
                 db.session.rollback()
                 raise ServiceException("Internal server error") from e
     return wrapper
-
@@ -3,14 +3,20 @@ import logging as log
 import base64
 import os
 
-import boto3
+from lambdas.utils import dt_utils
+from lambdas.utils.cache import TTLCache
+
+SECRETS_CACHE_TTL = float(os.environ.get('SECRETS_CACHE_TTL', '300'))
+
+_secret_cache = TTLCache(ttl=SECRETS_CACHE_TTL)
+_clients = {}
 
 
 class SecretsException(Exception):
     pass
 
 
-def get_secret_value(name: str, result_type=str):
+def get_secret_value(name: str, result_type=str, force_refresh: bool = False):
     log.debug("Fetching secret value for %s", name)
     env_var_name = name.upper().replace('-', '_')
     env_value = os.environ.get(env_var_name, None)
@@ -25,32 +31,53 @@ def get_secret_value(name: str, result_type=str):
     if region is None:
         raise SecretsException(f"Could not get AWS_REGION environment variable value while resolving {name}")
 
-    log.info("Fetching AWS Secret value for %s", name)
     arn_variable = f"{env_var_name}_ARN"
     arn = os.environ.get(arn_variable, None)
     if arn is None:
         raise SecretsException(f"Secret arn environment variable {arn_variable} not defined")
 
-    return get_secret(arn, region, result_type)
+    return get_secret(arn, region, result_type, force_refresh=force_refresh)
 
 
-def get_secret(secret_name: str, region_name: str, result_type=str):
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region_name
-    )
+def get_secret(secret_name: str, region_name: str, result_type=str, force_refresh: bool = False):
+    """Return the secret from the container-level cache, fetching it from Secrets Manager when it is
+    missing, older than SECRETS_CACHE_TTL seconds or ``force_refresh`` is set (e.g. after rotation)."""
+    secret_value = _secret_cache.get_or_load(
+        secret_name,
+        lambda: _fetch_secret(secret_name, region_name),
+        force_refresh=force_refresh)
+
+    if isinstance(secret_value, bytes):
+        return secret_value
+    if result_type == dict:
+        return json.loads(secret_value)
+    return secret_value
+
 
-    # In this sample we only handle
-    # We rethrow the exception by default.
+def invalidate_secret(secret_name: str = None):
+    _secret_cache.invalidate(secret_name)
 
-    get_secret_value_response = client.get_secret_value(
+
+def get_client(region_name: str):
+    client = _clients.get(region_name)
+    if client is None:
+        import boto3  # pylint: disable=import-outside-toplevel
+        session = boto3.session.Session()
+        client = session.client(
+            service_name='secretsmanager',
+            region_name=region_name
+        )
+        _clients[region_name] = client
+    return client
+
+
+@dt_utils.phase('secret_fetch')
+def _fetch_secret(secret_name: str, region_name: str):
+    log.info("Fetching AWS Secret %s from Secrets Manager", secret_name)
+    get_secret_value_response = get_client(region_name).get_secret_value(
         SecretId=secret_name
     )
     if 'SecretString' in get_secret_value_response:
-        secret_value = get_secret_value_response['SecretString']
-        if result_type == dict:
-            return json.loads(secret_value)
-        return secret_value
+        return get_secret_value_response['SecretString']
 
     return base64.b64decode(get_secret_value_response['SecretBinary'])
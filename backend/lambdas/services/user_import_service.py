@@ -0,0 +1,142 @@
+import csv
+import json
+import logging as log
+import os
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable, Iterator
+from uuid import uuid4
+
+from lambdas import is_local
+from lambdas.services import user_service
+from lambdas.utils import validators
+from lambdas.utils.validators import ValidationException
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+
+IMPORT_BUCKET = os.environ.get('IMPORT_BUCKET', None)
+# Directory that stands in for the import bucket when running locally
+LOCAL_IMPORT_DIR = os.environ.get('LOCAL_IMPORT_DIR', 'test_data')
+MAX_REPORTED_ERRORS = int(os.environ.get('IMPORT_MAX_REPORTED_ERRORS', '100'))
+
+MAX_USER_NAME_LENGTH = 128
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class ImportValidator:
+    """Validates parsed rows in a single streaming pass and keeps count of the rejected ones.
+
+    Only the first occurrence of a user name (case-insensitively) is imported, later ones are rejected.
+    """
+
+    def __init__(self, max_reported_errors: int = MAX_REPORTED_ERRORS):
+        self.max_reported_errors = max_reported_errors
+        self.rejected = 0
+        self.errors = []
+        self._seen = set()
+
+    def validate(self, records: Iterable[tuple]) -> Iterator[dict]:
+        for line, record, error in records:
+            if error is None:
+                error = self._check(record)
+            if error is not None:
+                self._reject(line, error)
+                continue
+            user_name = record['user_name'].strip()
+            self._seen.add(user_name.lower())
+            yield {'line': line, 'id': uuid4(), 'user_name': user_name,
+                   'name': record['name'].strip(), 'email': record['email'].strip()}
+
+    def _check(self, record: dict):
+        if not isinstance(record, dict):
+            return "Row is not an object"
+        for field in ('user_name', 'name', 'email'):
+            if not isinstance(record.get(field), str) or not validators.is_defined(record[field]):
+                return f"Field '{field}' is required"
+        user_name = record['user_name'].strip()
+        if len(user_name) > MAX_USER_NAME_LENGTH or any(c.isspace() for c in user_name):
+            return "Invalid user_name"
+        if user_name.lower() in self._seen:
+            return "Duplicate user_name"
+        if EMAIL_PATTERN.match(record['email'].strip()) is None:
+            return "Invalid email"
+        return None
+
+    def _reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'line': line, 'error': error})
+
+
+def parse_jsonl(lines: Iterable[str]) -> Iterator[tuple]:
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError:
+            yield line_number, None, "Invalid JSON"
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[tuple]:
+    reader = csv.DictReader(lines)
+    for record in reader:
+        if None in record:
+            yield reader.line_num, None, "Too many columns"
+            continue
+        yield reader.line_num, record, None
+
+
+def get_format(event: dict) -> str:
+    import_format = event.get('format', None)
+    if import_format is None:
+        key = event.get('key') or ''
+        import_format = FORMAT_CSV if key.lower().endswith('.csv') else FORMAT_JSONL
+    if import_format not in FORMATS:
+        raise ValidationException(f"Field 'format' value {import_format} is not one of {list(FORMATS)}")
+    return import_format
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    import boto3  # pylint: disable=import-outside-toplevel
+    return boto3.client('s3')
+
+
+@contextmanager
+def open_source(event: dict) -> Iterator[Iterable[str]]:
+    """Lines of the import, from the inline 'payload', or the object 'key' in the import bucket
+    (a file under LOCAL_IMPORT_DIR when running locally)."""
+    payload = event.get('payload', None)
+    if payload is not None:
+        yield payload.splitlines()
+        return
+
+    key = validators.get_event_value(event, 'key')
+    if is_local():
+        with open(os.path.join(LOCAL_IMPORT_DIR, key), mode='r', encoding='utf8', newline='') as file:
+            yield file
+        return
+
+    bucket = event.get('bucket') or IMPORT_BUCKET
+    validators.raise_not_defined('bucket', bucket)
+    body = get_s3_client().get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        yield (line.decode('utf8') for line in body.iter_lines())
+    finally:
+        body.close()
+
+
+def import_users(event: dict) -> dict:
+    import_format = get_format(event)
+    parse = parse_csv if import_format == FORMAT_CSV else parse_jsonl
+    validator = ImportValidator()
+    with open_source(event) as lines:
+        result = user_service.import_users(validator.validate(parse(lines)))
+
+    log.info("Imported users: %s inserted, %s updated, %s unchanged, %s rejected",
+             result['inserted'], result['updated'], result['unchanged'], validator.rejected)
+    return {'success': True, 'message': 'OK', **result, 'rejected': validator.rejected, 'errors': validator.errors}
@@ -1,15 +1,33 @@
+import os
 from functools import wraps
+from typing import Iterable
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
 
 from lambdas import is_local
-from lambdas.dao import user_dao, organisation_dao
+from lambdas.dao import user_dao
 from lambdas.models import UserAccount
 from lambdas.services.db_manager import get_app_db
+from lambdas.utils import dt_utils
+from lambdas.utils.cache import TTLCache
 from lambdas.utils.common import ServiceException, RequestException
 
 import logging as log
 
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '0'))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '1024'))
+USER_PAGE_SIZE = 100
+# Keeps a page well below the AppSync response size limit
+USER_PAGE_MAX_SIZE = 1000
+
 db = get_app_db()
 
+# Authenticated users keyed by Cognito username, only read by the users function. Entries are detached snapshots
+# that are merged into the current session without a SELECT. Users are written by other functions, whose containers
+# cannot reach this cache, so USER_CACHE_TTL alone bounds how stale an entry gets.
+_user_cache = TTLCache(ttl=USER_CACHE_TTL, max_size=USER_CACHE_MAX_SIZE)
+
 
 def get_user_info(user_name) -> dict:
     user = user_dao.find_user(user_name)
@@ -18,22 +36,63 @@ def get_user_info(user_name) -> dict:
     raise ServiceException("Bad Request")
 
 
-def create_or_update_user(user_name: str, user_attributes: dict):
-    org = organisation_dao.get_organisation(user_attributes["custom:user_organisation"])
-    user = user_dao.find_user(user_name)
-    name = _get_name(user_attributes)
-    email = user_attributes["email"]
-    if user is None:
-        user = UserAccount(
-            user_name=user_name, name=name, email=email, organisation_id=org.id
-        )
-        db.session.add(user)
-    else:
-        user.name = name
-        user.email = email
-        user.organisation_id = org.id
+def find_users_by_name(user_names) -> dict[str, UserAccount]:
+    """Users keyed by each requested name, the names are matched case-insensitively."""
+    user_names = list(user_names)
+    users = {user.user_name.lower(): user for user in user_dao.find_users(user_names)}
+    return {user_name: users[user_name.lower()] for user_name in user_names if user_name.lower() in users}
+
+
+def list_users(after: str = None, limit: int = None) -> dict:
+    """One page of users, serialized row by row while the rows are streamed from the database."""
+    limit = USER_PAGE_SIZE if limit is None else limit
+    if not 0 < limit <= USER_PAGE_MAX_SIZE:
+        raise ServiceException("Bad Request")
+
+    items = []
+    next_token = None
+    # One extra row tells whether another page follows
+    for user in user_dao.iter_users(after, limit + 1):
+        if len(items) == limit:
+            next_token = items[-1]['userName']
+            break
+        items.append(user.to_dict())
+    return {'items': items, 'nextToken': next_token}
+
 
+def create_or_update_user(user_name: str, user_attributes: dict) -> bool:
+    written = user_dao.upsert_user(user_name, name=_get_name(user_attributes), email=user_attributes["email"])
     db.session.commit()
+    return written
+
+
+def create_or_update_users(users: list[dict]) -> int:
+    """Write ``user_name, name, email`` rows with one statement, later (case-insensitive) duplicates of a user name
+    are ignored."""
+    rows = {}
+    for user in users:
+        rows.setdefault(user['user_name'].lower(), user)
+    written = user_dao.upsert_users(list(rows.values()))
+    db.session.commit()
+    return written
+
+
+def delete_users(user_names: list[str]) -> int:
+    deleted = user_dao.delete_users(user_names)
+    db.session.commit()
+    return deleted
+
+
+def import_users(rows: Iterable[dict]) -> dict:
+    """Stage the rows and merge them into user_account in one transaction.
+
+    ``rows`` are ``line, id, user_name, name, email`` dicts with unique (case-insensitive) user names.
+    """
+    user_dao.create_import_table()
+    staged = user_dao.stage_import_rows(rows)
+    inserted, updated = user_dao.merge_import_rows()
+    db.session.commit()
+    return {'inserted': inserted, 'updated': updated, 'unchanged': staged - inserted - updated}
 
 
 def delete_user(user_name: str):
@@ -54,22 +113,72 @@ def _get_name(user_attributes):
     return name
 
 
+def find_users_on_writer(user_names) -> dict[str, UserAccount]:
+    """Look up on the writer the users a read-only session on the reader did not find, keyed like
+    find_users_by_name. The Cognito hooks write on the writer, so a user who signed up a moment ago may not have
+    reached the reader yet. Returns nothing when the session does not read from the reader."""
+    if not db.reads_from_reader():
+        return {}
+    with db.writer_reads():
+        users = find_users_by_name(user_names)
+    if users:
+        log.info("Users %s not yet replicated to the reader, read from the writer", sorted(users))
+    return {user_name: db.session.merge(user, load=False) for user_name, user in users.items()}
+
+
+def find_authorized_user(user_name: str) -> UserAccount:
+    if not _user_cache.enabled:
+        return _find_identity_user(user_name)
+
+    snapshot = _user_cache.get(user_name)
+    if snapshot is not None:
+        dt_utils.count('UserCacheHits')
+        return db.session.merge(snapshot, load=False)
+
+    dt_utils.count('UserCacheMisses')
+    user = _find_identity_user(user_name)
+    if user is not None:
+        _user_cache.put(user_name, _snapshot(user))
+    return user
+
+
+def _find_identity_user(user_name: str) -> UserAccount:
+    user = user_dao.find_user(user_name)
+    if user is None:
+        user = find_users_on_writer([user_name]).get(user_name)
+    return user
+
+
+def user_cache_stats() -> dict:
+    return _user_cache.stats()
+
+
+def _snapshot(user: UserAccount) -> UserAccount:
+    snapshot = UserAccount(**{attr.key: getattr(user, attr.key) for attr in inspect(UserAccount).column_attrs})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def get_identity_user_name(event: dict) -> str:
+    identity = event.get("identity") or {}
+    user_name = identity.get("username", None)
+    if user_name is None:
+        if is_local():
+            log.warning(
+                "!!! RUNNING ON LOCAL PROFILE UTILIZING HARDCODED USERNAME !!!"
+            )
+            return "testuser"
+        raise ServiceException("Unauthorized")
+    return user_name
+
+
 def authorize_user(get_user_as_kwarg: bool = False):
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
             event = args[0]
-            user_name = event.get("identity", {}).get("username", None)
-            if user_name is None:
-                if is_local():
-                    log.warning(
-                        "!!! RUNNING ON LOCAL PROFILE UTILIZING HARDCODED USERNAME !!!"
-                    )
-                    user_name = "testuser"
-                else:
-                    raise ServiceException("Unauthorized")
-
-            user = user_dao.find_user(user_name)
+            user_name = get_identity_user_name(event)
+            user = find_authorized_user(user_name)
             if user is None:
                 raise ServiceException("Unauthorized")
 
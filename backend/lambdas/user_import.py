@@ -0,0 +1,19 @@
+import logging as log
+
+from lambdas import init_lambda
+from lambdas.services import user_import_service
+from lambdas.services.db_manager import with_db_session
+from lambdas.utils.common import log_invocation
+from lambdas.utils.validators import ValidationException
+
+init_lambda()
+
+
+@log_invocation
+@with_db_session
+def handler(event, _context):
+    try:
+        return user_import_service.import_users(event)
+    except ValidationException as e:
+        log.warning("User import rejected: %s", e)
+        return {'success': False, 'message': str(e)}
@@ -3,18 +3,87 @@ from lambdas.models import UserAccount
 from lambdas.services import user_service
 from lambdas.services.db_manager import with_db_session
 from lambdas.services.user_service import authorize_user
-from lambdas.utils.common import ServiceException
+from lambdas.utils.common import ServiceException, log_invocation
 
 init_lambda()
 
 
-@with_db_session
+@log_invocation
+@with_db_session(read_only=True)
+def handler(event, context):
+    # Reads run on the Aurora reader, which lags the writer the Cognito hooks write to. A caller who is not found
+    # there yet, e.g. right after sign-up, is looked up again on the writer before the request is refused.
+    if isinstance(event, list):
+        return batch_handler(event)
+    return single_handler(event, context)
+
+
 @authorize_user(get_user_as_kwarg=True)
-def handler(event, _context, user: UserAccount):
-    request = event.get('info', {}).get('fieldName')
+def single_handler(event, _context, user: UserAccount):
+    request = _get_field_name(event)
     if request == 'user':
         return user.to_dict()
     if request == 'getUser':
         user_name = event['arguments']['userName']
         return user_service.get_user_info(user_name)
-    raise ServiceException(f"Unknown request: '{request}')")
+    if request == 'listUsers':
+        arguments = event.get('arguments') or {}
+        return user_service.list_users(after=arguments.get('after'), limit=arguments.get('limit'))
+    raise ServiceException(f"Unknown request: '{request}'")
+
+
+def batch_handler(events: list) -> list:
+    """Resolve an AppSync BatchInvoke payload.
+
+    Caller identities and requested users are loaded with a single query and the results are returned
+    in request order, one ``{data, errorMessage, errorType}`` item per event.
+    """
+    identities = []
+    for event in events:
+        try:
+            identities.append(user_service.get_identity_user_name(event))
+        except ServiceException:
+            identities.append(None)
+
+    user_names = {name for name in identities if name is not None}
+    for event in events:
+        if _get_field_name(event) == 'getUser':
+            user_names.add(event.get('arguments', {}).get('userName'))
+    user_names.discard(None)
+
+    users = user_service.find_users_by_name(user_names)
+    missing = {name for name in identities if name is not None and name not in users}
+    if missing:
+        users.update(user_service.find_users_on_writer(missing))
+    serialized = {}
+
+    results = []
+    for event, identity in zip(events, identities):
+        try:
+            if users.get(identity) is None:
+                raise ServiceException("Unauthorized")
+            results.append({'data': _resolve_batch_item(event, users, serialized)})
+        except ServiceException as e:
+            results.append({'data': None, 'errorMessage': str(e), 'errorType': type(e).__name__})
+    return results
+
+
+def _resolve_batch_item(event: dict, users: dict, serialized: dict) -> dict:
+    request = _get_field_name(event)
+    if request == 'user':
+        user_name = user_service.get_identity_user_name(event)
+    elif request == 'getUser':
+        user_name = event.get('arguments', {}).get('userName')
+    else:
+        raise ServiceException(f"Unknown request: '{request}'")
+
+    user = users.get(user_name)
+    if user is None:
+        raise ServiceException("Bad Request")
+    if user_name not in serialized:
+        serialized[user_name] = user.to_dict()
+    return serialized[user_name]
+
+
+def _get_field_name(event: dict) -> str:
+    return event.get('info', {}).get('fieldName')
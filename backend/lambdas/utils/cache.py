@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after they were loaded.
+
+    ``get_or_load`` is single-flight: concurrent misses for the same key wait for one loader call.
+    A ``ttl`` of 0 disables caching and ``max_size`` of None leaves the cache unbounded.
+    """
+
+    def __init__(self, ttl: float, max_size: int = None, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: dict = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            if self.max_size is not None:
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], force_refresh: bool = False):
+        if not force_refresh:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        with self._lock_for(key):
+            if not force_refresh:
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is not None and entry[1] > self.clock():
+                    return entry[0]
+            value = loader()
+            self.put(key, value)
+            return value
+
+    def invalidate(self, key: Hashable = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def _lock_for(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MISSING = object()
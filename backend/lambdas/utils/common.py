@@ -1,29 +1,22 @@
-import decimal
+import json
 import logging as log
+import random
+import re
 import sys
-from datetime import datetime, date
-from enum import Enum
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from functools import wraps
 from json import JSONEncoder
-from typing import Callable
-from uuid import UUID
-
-from utils import dt_utils
-
-
-def serialize_object(value, default: Callable = None, **kwargs):  # pylint:disable=too-many-return-statements
-    if isinstance(value, UUID):
-        return str(value)
-    if isinstance(value, datetime):
-        return dt_utils.timestamp_to_iso(value)
-    if isinstance(value, date):
-        return dt_utils.date_to_iso(value)
-    if isinstance(value, Enum):
-        return value.name
-    if isinstance(value, (list, dict)):
-        return value
-    if isinstance(value, decimal.Decimal):
-        return float(value)
+from typing import Callable, Optional
+
+from lambdas.utils import serialization
+
+
+def serialize_object(value, default: Callable = None, **kwargs):
+    converter = serialization.registry.lookup(type(value))
+    if converter is not None:
+        return converter(value)
     if default is not None:
         self = kwargs.get('self', None)
         if self is not None:
@@ -55,6 +48,38 @@ def unmask_log_values(parameters: dict):
             log_manager.remove_mask_value(value)
 
 
+@contextmanager
+def request_masked_log_values(parameters: dict):
+    """Mask the parameter values only in records logged from the current request context."""
+    current = _request_masks.get()
+    values = frozenset(str(value) for value in parameters.values()) if parameters else frozenset()
+    if current is not None:
+        values = values.union(current.values)
+    token = _request_masks.set(RequestMasks(values) if values else None)
+    try:
+        yield
+    finally:
+        _request_masks.reset(token)
+
+
+def find_event_values(event, fields) -> dict:
+    """Values of the given field names anywhere in a (nested) event, keyed by their path."""
+    values = {}
+    stack = [('', event)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            for key, child in value.items():
+                child_path = f"{path}.{key}" if path else str(key)
+                if key in fields and isinstance(child, (str, int)) and not isinstance(child, bool):
+                    values[child_path] = child
+                else:
+                    stack.append((child_path, child))
+        elif isinstance(value, list):
+            stack.extend((f"{path}[{i}]", child) for i, child in enumerate(value))
+    return values
+
+
 class ServiceException(Exception):
     pass
 
@@ -63,29 +88,209 @@ class RequestException(Exception):
     pass
 
 
+MASK = '*****'
+
+
+class MaskMatcher:
+    """Replaces every occurrence of any mask value in a single regex pass.
+
+    The values are compiled into a prefix trie shaped pattern, so the regex engine branches on the next character
+    instead of trying every value at every position. Longer values win over their own prefixes.
+    """
+
+    def __init__(self, mask_values):
+        self.values = frozenset(str(value) for value in mask_values if str(value))
+        self.pattern = re.compile(_trie_pattern(self.values)) if self.values else None
+
+    def mask(self, value: str) -> str:
+        if self.pattern is None:
+            return value
+        return self.pattern.sub(MASK, value)
+
+
+def _trie_pattern(values) -> str:
+    trie: dict = {}
+    for value in values:
+        node = trie
+        for char in value:
+            node = node.setdefault(char, {})
+        node[''] = None
+    return _trie_node_pattern(trie)
+
+
+def _trie_node_pattern(node: dict) -> str:
+    # Follow single child chains iteratively so recursion depth only grows at branching points
+    prefix = []
+    while len(node) == 1 and '' not in node:
+        char, node = next(iter(node.items()))
+        prefix.append(re.escape(char))
+
+    is_end = '' in node
+    branches = [re.escape(char) + _trie_node_pattern(child) for char, child in sorted(node.items()) if char != '']
+    if not branches:
+        return ''.join(prefix)
+    group = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if is_end:
+        group = f"(?:{group})?" if len(branches) == 1 else f"{group}?"
+    return ''.join(prefix) + group
+
+
+class RequestMasks:
+    """Mask values of one request scope. The matcher combining them with the global values is built on first use
+    and lives as long as the scope, it is rebuilt only if the global values change meanwhile."""
+
+    def __init__(self, values: frozenset):
+        self.values = values
+        self._base = None
+        self._matcher = None
+
+    def matcher(self, base: MaskMatcher) -> MaskMatcher:
+        if self._base is not base:
+            self._matcher = MaskMatcher(base.values.union(self.values))
+            self._base = base
+        return self._matcher
+
+
+_request_masks: ContextVar[Optional[RequestMasks]] = ContextVar('request_masks', default=None)
+
+
 class SensitiveLogFormatter(log.Formatter):
 
     def __init__(self, formatter, mask_values):
         super().__init__()
         self.formatter = formatter
-        if mask_values:
-            self.mask_values = mask_values
-        else:
-            self.mask_values = []
+        self._matcher = MaskMatcher(())
+        self.mask_values = mask_values or []
+
+    @property
+    def mask_values(self) -> list:
+        return self._mask_values
 
-    def _filter(self, value: str):
+    @mask_values.setter
+    def mask_values(self, mask_values: list):
+        self._mask_values = mask_values
+        self._matcher = MaskMatcher(mask_values)
+
+    def _filter(self, value: str, request_masks: RequestMasks = None):
         if value and isinstance(value, str):
-            for mask_value in self.mask_values:
-                value = value.replace(str(mask_value), '*****')
+            if request_masks is None:
+                request_masks = _request_masks.get()
+            matcher = self._matcher if request_masks is None else request_masks.matcher(self._matcher)
+            value = matcher.mask(value)
         return value
 
     def format(self, record):
         if record:
-            original = self.formatter.format(record)
-            return self._filter(original)
+            # Buffered records carry the request masks that were active when they were logged
+            request_masks = getattr(record, 'request_masks', None)
+            if isinstance(self.formatter, JsonLogFormatter):
+                # Mask the values before encoding, JSON escapes would break masks spanning quotes or backslashes
+                return self.formatter.format(record, mask=lambda value: self._filter(value, request_masks))
+            return self._filter(self.formatter.format(record), request_masks)
         return None
 
 
+class JsonLogFormatter(log.Formatter):
+
+    def format(self, record, mask: Callable = None):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'location': f"{record.filename}:{record.lineno}",
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id is not None:
+            entry['requestId'] = request_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if mask is not None:
+            entry = {key: mask(value) for key, value in entry.items()}
+        return json.dumps(entry, default=str)
+
+
+class BufferedLogHandler(log.Handler):
+    """Keeps the records of an invocation in memory and writes them with a single stream write when it ends.
+
+    DEBUG records are only written for a sampled share (``debug_sample_rate``) of invocations, and every buffered
+    record is written when the invocation fails or logs an error. Outside an invocation records are written
+    immediately. Records that will be written are rendered when logged, DEBUG records only at flush time.
+    """
+
+    def __init__(self, stream, debug_sample_rate: float = 0.0, max_records: int = 10000):
+        super().__init__(level=log.DEBUG)
+        self.stream = stream
+        self.debug_sample_rate = debug_sample_rate
+        self.max_records = max_records
+        self.output_level = log.INFO
+        self.records = []
+        self.buffering = False
+        self.sampled = False
+        self.errored = False
+        self.request_id = None
+
+    def setLevel(self, level):
+        # Everything is captured, the configured level only decides what is written on flush
+        super().setLevel(level)
+        self.output_level = self.level
+        self.level = log.DEBUG
+
+    def start(self, request_id: str = None):
+        self.flush_buffer()
+        self.buffering = True
+        self.errored = False
+        self.sampled = self.debug_sample_rate > 0 and random.random() < self.debug_sample_rate
+        self.request_id = request_id
+
+    def stop(self):
+        self.flush_buffer()
+        self.buffering = False
+        self.request_id = None
+
+    def emit(self, record):
+        if not self.buffering:
+            if record.levelno >= self.output_level:
+                self._write([record])
+            return
+
+        if record.levelno >= log.ERROR:
+            self.errored = True
+        if record.levelno >= max(self.output_level, log.INFO):
+            record.msg = record.getMessage()
+            record.args = None
+        record.request_id = self.request_id
+        record.request_masks = _request_masks.get()
+        self.records.append(record)
+        if len(self.records) >= self.max_records:
+            self.flush_buffer()
+
+    def flush_buffer(self):
+        if not self.records:
+            return
+        if self.errored:
+            threshold = log.NOTSET
+        elif self.sampled:
+            threshold = min(self.output_level, log.DEBUG)
+        else:
+            threshold = max(self.output_level, log.INFO)
+        records, self.records = self.records, []
+        self._write([record for record in records if record.levelno >= threshold])
+
+    def _write(self, records: list):
+        if not records:
+            return
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:  # pylint: disable=broad-except
+                self.handleError(record)
+        self.stream.write(self.terminator.join(lines) + self.terminator)
+        self.stream.flush()
+
+    terminator = '\n'
+
+
 class Singleton(type):
     _instances = {}
 
@@ -102,7 +307,18 @@ class LogManager(metaclass=Singleton):
         self.mask_values = []
         self.formatter = None
 
-    def init_logging(self, mask_values: list = None, log_level=log.INFO, stream=None):
+    def init_logging(self, mask_values: list = None,  # pylint: disable=too-many-arguments
+                     log_level=log.INFO,
+                     stream=None,
+                     log_format: str = 'text',
+                     buffered: bool = False,
+                     debug_sample_rate: float = None):
+        """Attach the root handler.
+
+        With ``buffered`` the records of each ``invocation()`` are written once at its end, and DEBUG records are
+        kept for ``debug_sample_rate`` of the invocations (by default all of them when ``log_level`` is DEBUG).
+        ``log_format`` 'json' writes one JSON object per record.
+        """
         if stream is None:
             stream = sys.stdout
 
@@ -110,8 +326,16 @@ class LogManager(metaclass=Singleton):
         if self.handler is not None:
             root.removeHandler(self.handler)
 
-        self.handler = log.StreamHandler(stream)
-        formatter = log.Formatter('%(asctime)s %(levelname)s (%(filename)s:%(lineno)d) - %(message)s')
+        if buffered:
+            if debug_sample_rate is None:
+                debug_sample_rate = 1.0 if log_level <= log.DEBUG else 0.0
+            self.handler = BufferedLogHandler(stream, debug_sample_rate=debug_sample_rate)
+        else:
+            self.handler = log.StreamHandler(stream)
+        if log_format == 'json':
+            formatter = JsonLogFormatter()
+        else:
+            formatter = log.Formatter('%(asctime)s %(levelname)s (%(filename)s:%(lineno)d) - %(message)s')
         self.handler.setFormatter(formatter)
         root.addHandler(self.handler)
 
@@ -120,8 +344,6 @@ class LogManager(metaclass=Singleton):
             for value in mask_values:
                 self.mask_values.append(str(value))
 
-            self.mask_values.sort(key=len, reverse=True)
-
         self.formatter = SensitiveLogFormatter(self.handler.formatter, self.mask_values)
         for handler in log.root.handlers:
             handler.setFormatter(self.formatter)
@@ -138,6 +360,25 @@ class LogManager(metaclass=Singleton):
         root.setLevel(log_level)
         for handler in log.root.handlers:
             handler.setLevel(log_level)
+            if isinstance(handler, BufferedLogHandler):
+                # DEBUG records are captured so they can be written for sampled or failed invocations
+                root.setLevel(min(root.level, handler.level))
+
+    @contextmanager
+    def invocation(self, request_id: str = None):
+        handler = self.handler
+        if not isinstance(handler, BufferedLogHandler):
+            yield
+            return
+
+        handler.start(request_id)
+        try:
+            yield
+        except BaseException:
+            handler.errored = True
+            raise
+        finally:
+            handler.stop()
 
     @staticmethod
     def set_debug(debug=False):
@@ -151,7 +392,6 @@ class LogManager(metaclass=Singleton):
         value = str(mask_value)
         if value not in self.mask_values:
             self.mask_values.append(value)
-            self.mask_values.sort(key=len, reverse=True)
             if self.formatter is not None:
                 self.formatter.mask_values = self.mask_values
 
@@ -159,7 +399,6 @@ class LogManager(metaclass=Singleton):
         value = str(mask_value)
         if value in self.mask_values:
             self.mask_values.remove(value)
-            self.mask_values.sort(key=len, reverse=True)
             if self.formatter is not None:
                 self.formatter.mask_values = self.mask_values
 
@@ -174,6 +413,26 @@ class LogManager(metaclass=Singleton):
         LogManager._instances = {}
 
 
+def log_invocation(fn=None, *, mask_fields: tuple = ()):
+    """Scope the buffered logging of one Lambda invocation, a no-op unless LogManager runs in buffered mode.
+
+    The values of the ``mask_fields`` found anywhere in the event are masked in the records of this invocation only.
+    Use as ``@log_invocation`` or ``@log_invocation(mask_fields=('password',))``.
+    """
+    if fn is None:
+        return lambda function: log_invocation(function, mask_fields=mask_fields)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        event = args[0] if args else None
+        context = args[1] if len(args) > 1 else None
+        masked = find_event_values(event, mask_fields) if mask_fields else None
+        with request_masked_log_values(masked), \
+                LogManager().invocation(request_id=getattr(context, 'aws_request_id', None)):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
 def lambda_result(success: bool = False, message: str = None):
     result = {'success': success}
     if message is not None:
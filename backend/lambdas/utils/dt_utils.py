@@ -1,6 +1,12 @@
+import json
 import logging as log
+import os
+import sys
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone, date
+from functools import wraps
 
 from dateutil import parser
 
@@ -43,18 +49,137 @@ def datetime_from_millis(millis, tz=None) -> datetime:
     return datetime.fromtimestamp(float(millis) / 1000, tz)
 
 
+class PhaseTimings:
+    """Durations of the named phases of one invocation, summed per phase, and the invocation's event counters."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = None
+        self.phases: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float):
+        totals = self.phases.get(phase)
+        if totals is None:
+            self.phases[phase] = [seconds, 1]
+        else:
+            totals[0] += seconds
+            totals[1] += 1
+
+    def count(self, counter: str, value: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+
+    def to_emf(self, namespace: str, dimensions: dict = None) -> dict:
+        """CloudWatch embedded metric format document with one millisecond metric per phase and one count metric
+        per counter.
+
+        The number of times a phase ran is included as a ``<phase>.count`` property, it is not a metric.
+        """
+        dimensions = dimensions or {}
+        document = {'_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in ['invocation', *self.phases]]
+                + [{'Name': name, 'Unit': 'Count'} for name in self.counters],
+            }],
+        }}
+        document.update(dimensions)
+        document['invocation'] = round((self.duration or 0) * 1000, 3)
+        for name, (seconds, count) in self.phases.items():
+            document[name] = round(seconds * 1000, 3)
+            document[f"{name}.count"] = count
+        document.update(self.counters)
+        return document
+
+
+_current_timings: ContextVar[PhaseTimings] = ContextVar('phase_timings', default=None)
+
+
+@contextmanager
+def invocation_timings(namespace: str = None, dimensions: dict = None, stream=None):
+    """Collect the phases timed during the block and write them as one embedded metric format line at its end.
+
+    Nothing is written without a ``namespace`` (METRICS_NAMESPACE by default). A nested call joins the timings of
+    the enclosing invocation.
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        yield timings
+        return
+
+    timings = PhaseTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+        timings.stop()
+        namespace = namespace or os.environ.get('METRICS_NAMESPACE')
+        if namespace:
+            if dimensions is None:
+                dimensions = {'FunctionName': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')}
+            stream = stream or sys.stdout
+            # Written around the log handlers, CloudWatch only extracts metrics from lines that are plain JSON
+            stream.write(json.dumps(timings.to_emf(namespace, dimensions)) + '\n')
+            stream.flush()
+
+
 class Timer:
-    def __init__(self, level=log.DEBUG):
+    """Measures a block of code, logs the duration at ``level`` (None disables the log) and adds it to the
+    invocation's timings under ``phase``.
+
+    Use start()/stop(), ``with Timer(...)`` or decorate a function with a Timer instance.
+    """
+
+    def __init__(self, message: str = 'Operation', level=log.DEBUG, phase: str = None):
         self.level = level
+        self.phase = phase
         self.timer_start = None
         self.timer_stop = None
-        self.message = None
-
-    def start(self, message: str = 'Operation'):
         self.message = message
+
+    def start(self, message: str = None):
+        if message is not None:
+            self.message = message
         self.timer_start = time.perf_counter()
 
     def stop(self, write_log: bool = True):
         self.timer_stop = time.perf_counter()
-        if write_log:
-            log.log(self.level, "%s took %s seconds", self.message, self.timer_stop - self.timer_start)
+        elapsed = self.timer_stop - self.timer_start
+        if self.phase is not None:
+            timings = _current_timings.get()
+            if timings is not None:
+                timings.add(self.phase, elapsed)
+        if write_log and self.level is not None:
+            log.log(self.level, "%s took %s seconds", self.message, elapsed)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Timer(self.message, self.level, self.phase):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def count(counter: str, value: int = 1):
+    """Add ``value`` to ``counter`` in the current invocation's metrics, a no-op outside an invocation."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.count(counter, value)
+
+
+def phase(name: str) -> Timer:
+    """Silent Timer that only records ``name`` in the current invocation's timings."""
+    return Timer(name, level=None, phase=name)
@@ -0,0 +1,60 @@
+"""JSON conversion of the values the encoders do not handle natively, dispatched on the exact value type.
+
+Converters are registered per type. A type without its own converter resolves to the converter of its nearest
+registered base class, the result is cached per type so the MRO is only walked once.
+
+The Lambda runtime encodes the handler results itself, the registry is reached through the JSONEncoder.default
+installed by common.init_json_serialisation.
+"""
+import decimal
+from datetime import datetime, date
+from enum import Enum
+from typing import Callable, Optional
+from uuid import UUID
+
+from lambdas.utils import dt_utils
+
+
+class TypeRegistry:
+
+    def __init__(self):
+        self._converters: dict[type, Callable] = {}
+        self._resolved: dict[type, Optional[Callable]] = {}
+
+    def register(self, value_type: type, converter: Callable):
+        self._converters[value_type] = converter
+        self._resolved.clear()
+
+    def lookup(self, value_type: type) -> Optional[Callable]:
+        try:
+            return self._resolved[value_type]
+        except KeyError:
+            converter = next((self._converters[base] for base in value_type.__mro__ if base in self._converters),
+                             None)
+            self._resolved[value_type] = converter
+            return converter
+
+
+def _identity(value):
+    return value
+
+
+def _enum_name(value: Enum) -> str:
+    return value.name
+
+
+registry = TypeRegistry()
+registry.register(UUID, str)
+registry.register(datetime, dt_utils.timestamp_to_iso)
+registry.register(date, dt_utils.date_to_iso)
+registry.register(Enum, _enum_name)
+registry.register(list, _identity)
+registry.register(dict, _identity)
+registry.register(decimal.Decimal, float)
+
+
+def convert(value, fallback: Callable = str):
+    converter = registry.lookup(type(value))
+    if converter is not None:
+        return converter(value)
+    return fallback(value)
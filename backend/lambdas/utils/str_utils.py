@@ -1,4 +1,5 @@
 import json
+from functools import lru_cache
 from typing import Optional, Any
 from uuid import UUID
 
@@ -68,6 +69,7 @@ def get_uuid(value):
     return None
 
 
+@lru_cache(maxsize=4096)
 def convert_snake_to_camel_case(value: str) -> str:
     components = value.split('_')
     return f"{components[0]}{''.join(x.title() for x in components[1:])}"
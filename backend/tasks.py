@@ -20,6 +20,7 @@ def generatemigrations(_, message):
         raise Exception("Migration message must be defined")
     run('alembic --config lambdas/migrations/alembic.ini revision --autogenerate -m "' + message + '"',
         env=env | {'PYTHONPATH': './:./lambdas'})
+    migrationhead(_)
 
 
 @task
@@ -28,6 +29,19 @@ def createmigration(_, message):
         raise Exception("Migration message must be defined")
     run('alembic --config lambdas/migrations/alembic.ini revision -m "' + message + '"',
         env=env | {'PYTHONPATH': './:./lambdas'})
+    migrationhead(_)
+
+
+@task
+def migrationhead(_):
+    """Write the script head the migration Lambda compares alembic_version against"""
+    # Computed here, importing the migration Lambda would initialize its logging and print to stdout
+    from alembic.config import Config  # pylint: disable=import-outside-toplevel
+    from alembic.script import ScriptDirectory  # pylint: disable=import-outside-toplevel
+
+    head = ScriptDirectory.from_config(Config('lambdas/migrations/alembic.ini')).get_current_head()
+    with open('lambdas/migrations/alembic_head', 'w', encoding='utf8') as head_file:
+        head_file.write(head + '\n')
 
 
 @task
@@ -56,6 +70,15 @@ def dropdb(_):
     run(cmd, env=env | {'PYTHONPATH': './:./lambdas'})
 
 
+@task
+def setupdbs(_, spec, apply=False):
+    """Plan (or with --apply, apply) the roles and databases listed in the JSON file spec"""
+    with open(spec, 'r', encoding='utf8') as spec_file:
+        payload = json.load(spec_file) | {"action": "apply" if apply else "plan"}
+    cmd = f"python ./lambdas/migrations/db_setup.py '{json.dumps(payload)}'"
+    run(cmd, env=env | {'PYTHONPATH': './:./lambdas'})
+
+
 @task
 def unittests(_):
     cmd = 'pytest ./tests/unit'
@@ -63,11 +86,43 @@ def unittests(_):
 
 
 @task
-def integrationtests(_):
-    cmd = 'pytest ./tests/integration'
+def integrationtests(_, workers='auto'):
+    cmd = f'pytest -n {workers} ./tests/integration'
     run(cmd, env=env | {'PYTHONPATH': './:./lambdas:./tests'})
 
 
+@task
+def benchmarks(_, db='sqlite', sizes='10000,100000,1000000', output='benchmark_results.json'):
+    cmd = f'python -m benchmarks run --db {db} --sizes {sizes} --output {output}'
+    run(cmd, env=env | {'PYTHONPATH': './:./lambdas'})
+
+
+@task
+def comparebenchmarks(_, base, head, fail_over=None):
+    cmd = f'python -m benchmarks compare {base} {head}'
+    if fail_over is not None:
+        cmd += f' --fail-over {fail_over}'
+    run(cmd, env=env | {'PYTHONPATH': './:./lambdas'})
+
+
+@task
+def importreport(_, top=10, budget=None):
+    cmd = f'python -m tools.import_report --top {top}'
+    if budget is not None:
+        cmd += f' --budget-ms {budget}'
+    run(cmd, env=env)
+
+
+@task
+def loadtest(_, rps=None, concurrency=None, duration=30, output=None):
+    cmd = 'python -m tools.load_test'
+    cmd += f' --rps {rps}' if rps is not None else f' --concurrency {concurrency or 10}'
+    cmd += f' --duration {duration}'
+    if output is not None:
+        cmd += f' --output {output}'
+    run(cmd, env=env | {'PYTHONPATH': './:./lambdas'})
+
+
 @task(pre=[unittests, integrationtests])
 def alltests(_):
     pass
@@ -7,18 +7,55 @@ from uuid import uuid4
 import boto3
 from gql import gql, Client
 from gql.dsl import dsl_gql
-from gql.transport.aiohttp import AIOHTTPTransport
-from gql.transport.appsync_auth import AppSyncJWTAuthentication
+from gql.client import SyncClientSession
 from gql.transport.exceptions import TransportQueryError
+from gql.transport.requests import RequestsHTTPTransport
 from random_username.generate import generate_username
 
-from tests.integration.conftest import TestContext
-from utils.common import Singleton
+from tests.integration.cognito_tokens import CachedRequestsAuthentication
+from tests.integration.token_cache import TokenCache
 
 GROUP_SYSADMIN: str = 'LOCAL_SYSADMIN'
 
 ALL_GROUPS: list[str] = [GROUP_SYSADMIN]
 
+TEST_HELPER_FUNCTION = 'example-local-devTestHelper'
+
+
+@dataclass
+class TestContext:
+    region: str
+    endpoint_url: str
+    graphql_url: str
+    host: str
+
+
+def get_graphql_url(api_list_response: dict):
+    api_list = api_list_response['graphqlApis']
+    for api in api_list:
+        if api['name'] == 'example-local-graphql':
+            return api['uris']['GRAPHQL']
+
+    raise Exception("Portal GraphQL API endpoint not found")
+
+
+def build_context(endpoint_url: str, region: str) -> TestContext:
+    session = boto3.Session(profile_name="serverless")
+    client = session.client("appsync", endpoint_url=endpoint_url, region_name=region)
+
+    url = get_graphql_url(client.list_graphql_apis())
+    if not (url.startswith('http://') or url.startswith('https://')):
+        raise Exception(f"Invalid URL {url}")
+
+    host = url.split('/')[2]
+
+    return TestContext(
+        region=region,
+        endpoint_url=endpoint_url,
+        graphql_url=url,
+        host=host
+    )
+
 
 @dataclass
 class User:
@@ -29,7 +66,7 @@ class User:
     token: str = None
 
 
-class AWSUtils(metaclass=Singleton):
+class AWSUtils:
 
     def __init__(self, ctx: TestContext):
         self.ctx = ctx
@@ -44,6 +81,7 @@ class AWSUtils(metaclass=Singleton):
             endpoint_url=ctx.endpoint_url,
             region_name=ctx.region
         )
+        self.tokens = TokenCache(self.cognito_client)
 
         if os.path.isfile('schema.graphql'):
             path = ''
@@ -68,26 +106,72 @@ class AWSUtils(metaclass=Singleton):
         raise Exception(f"Call to lambda {function_name} failed")
 
     def authenticate(self, user: User):
-        response = self.cognito_client.admin_initiate_auth(
-            UserPoolId=user.user_pool_id,
-            ClientId=user.client_id,
-            AuthFlow='USER_PASSWORD_AUTH',
-            AuthParameters={
-                'USERNAME': user.username,
-                'PASSWORD': str(user.password)
-            }
-        )
-        user.token = response['AuthenticationResult']['IdToken']
+        user.token = self.tokens.get_token(user)
         return user
 
+    def create_users(self, users: list[dict]) -> dict:
+        return self.call_lambda(payload={'action': 'create_users', 'users': users},
+                                function_name=TEST_HELPER_FUNCTION)
+
+    def delete_users(self, usernames: list[str]) -> dict:
+        return self.call_lambda(payload={'action': 'delete_users', 'usernames': usernames},
+                                function_name=TEST_HELPER_FUNCTION)
+
+
+class UserPool:
+    """Users provisioned up front for one test worker with a single batch call, authenticated once and deleted
+    when the worker is done. Usernames carry the worker name so parallel workers never share a user."""
+
+    def __init__(self, aws: AWSUtils, worker: str, size: int, groups: list[str] = None):
+        self.aws = aws
+        prefix = f"it-{worker}-{uuid4().hex[:8]}"
+        users = [{'username': f"{prefix}-{i}",
+                  'email': f"{prefix}-{i}@example.com.invalid",
+                  'password': f"Pw-{uuid4()}",
+                  'groups': groups if groups is not None else ALL_GROUPS} for i in range(size)]
+        result = aws.create_users(users)
+        failed = [user for user in result['users'] if user['status'] == 'Failed']
+        if failed:
+            raise Exception(f"Provisioning test users failed: {failed}")
+
+        self.users = [aws.authenticate(User(username=user['username'],
+                                            password=user['password'],
+                                            user_pool_id=result['userPoolId'],
+                                            client_id=result['clientId'])) for user in users]
+
+    def take(self, count: int) -> list[User]:
+        if count > len(self.users):
+            raise Exception(f"User pool has {len(self.users)} users, {count} requested")
+        return self.users[:count]
+
     def destroy(self):
-        self.ctx = None
-        self.session = None
-        self.lambda_client = None
-        AWSUtils._instances = {}
+        self.aws.delete_users([user.username for user in self.users])
+        self.users = []
+
+
+class GqlSessions:
+    """One connected GraphQL session per user, reused for every query the user makes during the test run."""
+
+    def __init__(self, ctx: TestContext, schema: str, tokens: TokenCache):
+        self.ctx = ctx
+        self.schema = schema
+        self.tokens = tokens
+        self._sessions: dict[str, SyncClientSession] = {}
+
+    def get(self, user: User) -> SyncClientSession:
+        session = self._sessions.get(user.username)
+        if session is None:
+            session = get_gql_client(self.ctx, user, self.schema, self.tokens).connect_sync()
+            self._sessions[user.username] = session
+        return session
+
+    def close(self):
+        for session in self._sessions.values():
+            session.client.close_sync()
+        self._sessions = {}
 
 
-def create_user(ctx: TestContext,
+def create_user(aws: AWSUtils,
                 username: str = None,
                 password: str = None,
                 groups: list[str] = None,
@@ -110,30 +194,22 @@ def create_user(ctx: TestContext,
         "groups": groups,
     }
 
-    aws = AWSUtils(ctx)
-    result = aws.call_lambda(payload=payload, function_name='example-local-devTestHelper')
+    result = aws.call_lambda(payload=payload, function_name=TEST_HELPER_FUNCTION)
     user = User(username=username, password=password, user_pool_id=result['userPoolId'], client_id=result['clientId'])
     if do_auth:
-        user = authenticate(ctx=ctx, user=user)
+        user = aws.authenticate(user)
     return user
 
 
-def authenticate(ctx: TestContext, user: User) -> User:
-    aws = AWSUtils(ctx)
-    return aws.authenticate(user)
-
-
-def get_gql_client(ctx: TestContext, user: User) -> Client:
-    auth = AppSyncJWTAuthentication(
-        host=ctx.host,
-        jwt=user.token,
-    )
-    transport = AIOHTTPTransport(url=ctx.graphql_url, auth=auth)
-    aws = AWSUtils(ctx=ctx)
-    return Client(transport=transport, fetch_schema_from_transport=False, schema=aws.schema)
+def get_gql_client(ctx: TestContext, user: User, schema: str, tokens: TokenCache) -> Client:
+    # The requests transport keeps a pooled HTTP session open while the client is connected, the token is read
+    # from the cache on every request so renewed tokens are picked up
+    auth = CachedRequestsAuthentication(host=ctx.host, tokens=tokens, user=user)
+    transport = RequestsHTTPTransport(url=ctx.graphql_url, auth=auth)
+    return Client(transport=transport, fetch_schema_from_transport=False, schema=schema)
 
 
-def query_gql(client: Client, query):
+def query_gql(client, query):
     if isinstance(query, str):
         q = gql(query)
     else:
@@ -148,6 +224,5 @@ def query_gql(client: Client, query):
         return e.errors
 
 
-def do_gql(ctx: TestContext, user: User, query):
-    client = get_gql_client(ctx, user)
-    return query_gql(client=client, query=query)
+def do_gql(sessions: GqlSessions, user: User, query):
+    return query_gql(client=sessions.get(user), query=query)
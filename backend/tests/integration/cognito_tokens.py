@@ -0,0 +1,32 @@
+"""Authentication for the gql and requests transports using the Cognito ID tokens of a TokenCache."""
+import requests
+from gql.transport.appsync_auth import AppSyncJWTAuthentication
+
+from tests.integration.token_cache import TokenCache
+
+
+class CachedAppSyncAuthentication(AppSyncJWTAuthentication):
+    """AppSync JWT auth for the gql AIOHTTP transport that reads the current token from the cache per request."""
+
+    def __init__(self, host: str, tokens: TokenCache, user):
+        super().__init__(host=host, jwt=tokens.get_token(user))
+        self.tokens = tokens
+        self.user = user
+
+    def get_headers(self, data=None, headers=None):
+        self.jwt = self.tokens.get_token(self.user)
+        return super().get_headers(data, headers)
+
+
+class CachedRequestsAuthentication(requests.auth.AuthBase):
+    """The same for the requests transport."""
+
+    def __init__(self, host: str, tokens: TokenCache, user):
+        self.host = host
+        self.tokens = tokens
+        self.user = user
+
+    def __call__(self, request):
+        request.headers['host'] = self.host
+        request.headers['Authorization'] = self.tokens.get_token(self.user)
+        return request
@@ -1,27 +1,13 @@
 import logging as log
-from dataclasses import dataclass
+import os
 
-import boto3
 import pytest
 
 from lambdas.utils.common import LogManager, init_json_serialisation
+from tests.integration.aws_utils import AWSUtils, UserPool, GqlSessions, build_context
 
-
-@dataclass
-class TestContext:
-    region: str
-    endpoint_url: str
-    graphql_url: str
-    host: str
-
-
-def get_graphql_url(api_list_response: dict):
-    api_list = api_list_response['graphqlApis']
-    for api in api_list:
-        if api['name'] == 'example-local-graphql':
-            return api['uris']['GRAPHQL']
-
-    raise Exception("Portal GraphQL API endpoint not found")
+# Users provisioned per test worker, enough for the test needing the most users at once
+USER_POOL_SIZE = int(os.environ.get('INTEGRATION_USER_POOL_SIZE', '4'))
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -39,20 +25,30 @@ def ctx():
 
     init_json_serialisation()
 
-    endpoint_url = "http://localhost:4566"
-    region = "us-east-1"
-    session = boto3.Session(profile_name="serverless")
-    client = session.client("appsync", endpoint_url=endpoint_url, region_name=region)
+    return build_context(endpoint_url="http://localhost:4566", region="us-east-1")
+
+
+@pytest.fixture(scope="session")
+def worker():
+    # Set by pytest-xdist, every worker process gets its own session scoped fixtures
+    return os.environ.get('PYTEST_XDIST_WORKER', 'master')
+
+
+@pytest.fixture(scope="session")
+def aws(ctx):
+    return AWSUtils(ctx)
+
 
-    url = get_graphql_url(client.list_graphql_apis())
-    if not (url.startswith('http://') or url.startswith('https://')):
-        raise Exception(f"Invalid URL {url}")
+@pytest.fixture(scope="session")
+def user_pool(aws, worker):
+    pool = UserPool(aws, worker=worker, size=USER_POOL_SIZE)
+    yield pool
+    pool.destroy()
 
-    host = url.split('/')[2]
 
-    return TestContext(
-        region=region,
-        endpoint_url=endpoint_url,
-        graphql_url=url,
-        host=host
-    )
+@pytest.fixture(scope="session")
+def gql_sessions(ctx, aws):
+    sessions = GqlSessions(ctx, aws.schema, aws.tokens)
+    yield sessions
+    sessions.close()
+    aws.tokens.close()
@@ -1,28 +1,20 @@
 from gql.dsl import DSLSchema, DSLMutation, DSLInlineFragment, DSLMetaField
 from random_username.generate import generate_username
 
-from aws_utils import create_user, GROUP_SYSADMIN, get_gql_client, query_gql, AWSUtils
-from conftest import TestContext
+from aws_utils import query_gql, GqlSessions, UserPool
 from utils import str_utils
-from utils.common import Singleton
 
 
-class PortalUtils(metaclass=Singleton):
-    def __init__(self, ctx: TestContext):
-        self.ctx = ctx
-        self.aws = AWSUtils(ctx)
-        self.sysadmin = create_user(ctx=ctx, groups=[GROUP_SYSADMIN], do_auth=False)
+class PortalUtils:
+    def __init__(self, user_pool: UserPool, gql_sessions: GqlSessions):
+        self.sysadmin = user_pool.take(1)[0]
+        self.gql_sessions = gql_sessions
 
-    def authenticate_sysadmin(self):
-        self.sysadmin = self.aws.authenticate(self.sysadmin)
 
-
-def create_org(ctx):
+def create_org(portal: PortalUtils):
     org_name = generate_username()[0]
-    utils = PortalUtils(ctx=ctx)
-    utils.authenticate_sysadmin()
-    client = get_gql_client(ctx=ctx, user=utils.sysadmin)
-    ds: DSLSchema = DSLSchema(client.schema)
+    client = portal.gql_sessions.get(portal.sysadmin)
+    ds: DSLSchema = DSLSchema(client.client.schema)
     query = DSLMutation(
         ds.Mutation.createOrganisation.args(
             name=org_name,
@@ -1,14 +1,13 @@
 from gql.dsl import DSLSchema, DSLQuery
 
-from tests.integration.aws_utils import create_user, get_gql_client, query_gql, GROUP_SYSADMIN
+from tests.integration.aws_utils import query_gql
 
 
-def test_get_user_information(ctx):
-    user_1 = create_user(ctx=ctx, groups=[GROUP_SYSADMIN])
-    user_2 = create_user(ctx=ctx, groups=[GROUP_SYSADMIN])
+def test_get_user_information(user_pool, gql_sessions):
+    user_1, user_2 = user_pool.take(2)
 
-    client = get_gql_client(ctx=ctx, user=user_1)
-    ds: DSLSchema = DSLSchema(client.schema)
+    client = gql_sessions.get(user_1)
+    ds: DSLSchema = DSLSchema(client.client.schema)
     query = DSLQuery(
         ds.Query.user().select(
                ds.UserAccount.userName,
@@ -21,18 +20,17 @@ def test_get_user_information(ctx):
     assert result['user']['userName'] == user_1.username
     assert result['user']['organisation']['name'] == 'Eficode'
 
-    client = get_gql_client(ctx=ctx, user=user_2)
+    client = gql_sessions.get(user_2)
     result = query_gql(client=client, query=query)
     assert result['user']['userName'] == user_2.username
     assert result['user']['organisation']['name'] == 'Eficode'
 
 
-def test_sysadmin_get_user_information(ctx):
-    user_1 = create_user(ctx=ctx, groups=[GROUP_SYSADMIN])
-    sysadmin = create_user(ctx=ctx, groups=[GROUP_SYSADMIN])
+def test_sysadmin_get_user_information(user_pool, gql_sessions):
+    user_1, sysadmin = user_pool.take(2)
 
-    client = get_gql_client(ctx=ctx, user=sysadmin)
-    ds: DSLSchema = DSLSchema(client.schema)
+    client = gql_sessions.get(sysadmin)
+    ds: DSLSchema = DSLSchema(client.client.schema)
     query = DSLQuery(
         ds.Query.getUser(userName=user_1.username).select(
                ds.UserAccount.userName,
@@ -56,6 +54,6 @@ def test_sysadmin_get_user_information(ctx):
     result = query_gql(client=client, query=faulty_query)
     assert result[0]['errorType'] == 'TypeError'
 
-    client = get_gql_client(ctx=ctx, user=user_1)
+    client = gql_sessions.get(user_1)
     result = query_gql(client=client, query=query)
     assert result[0]['errorType'] == 'Unauthorized'
@@ -0,0 +1,125 @@
+"""Cognito ID token cache shared by the integration tests and the load generator.
+
+Tokens are cached per user until shortly before their ``exp``. Within ``refresh_ahead`` seconds of expiry the cached
+token is still returned while a background thread renews it with the refresh token, so authentication stays off
+the request path. Only an expired (or missing) token makes the caller wait, and concurrent callers share a single
+renewal per user.
+"""
+import base64
+import json
+import logging as log
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# Tokens closer than this to expiry are not handed out any more
+MIN_VALIDITY_SECONDS = 5
+
+
+@dataclass
+class CachedTokens:
+    id_token: str
+    refresh_token: str
+    expires_at: float
+
+
+def jwt_expiry(token: str) -> float:
+    payload = token.split('.')[1]
+    payload += '=' * (-len(payload) % 4)
+    return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+
+
+class TokenCache:
+
+    def __init__(self, cognito_client, refresh_ahead: float = 60, clock=time.time):
+        self.cognito_client = cognito_client
+        self.refresh_ahead = refresh_ahead
+        self.clock = clock
+        self.stats = Counter()
+        self._tokens: dict[str, CachedTokens] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='token-refresh')
+
+    def get_token(self, user) -> str:
+        tokens = self._tokens.get(user.username)
+        if tokens is not None:
+            remaining = tokens.expires_at - self.clock()
+            if remaining > self.refresh_ahead:
+                return tokens.id_token
+            if remaining > MIN_VALIDITY_SECONDS:
+                self._refresh_in_background(user)
+                return tokens.id_token
+        return self._refresh(user).id_token
+
+    def invalidate(self, username: str = None):
+        with self._lock:
+            if username is None:
+                self._tokens.clear()
+            else:
+                self._tokens.pop(username, None)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _refresh(self, user) -> CachedTokens:
+        with self._lock_for(user.username):
+            # Another caller may have renewed the token while this one waited for the lock
+            tokens = self._tokens.get(user.username)
+            if tokens is not None and tokens.expires_at - self.clock() > self.refresh_ahead:
+                return tokens
+            tokens = self._authenticate(user, tokens)
+            self._tokens[user.username] = tokens
+            return tokens
+
+    def _refresh_in_background(self, user):
+        with self._lock:
+            if user.username in self._refreshing:
+                return
+            self._refreshing.add(user.username)
+
+        def refresh():
+            try:
+                self._refresh(user)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Background token refresh for %s failed", user.username)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(user.username)
+
+        self._executor.submit(refresh)
+
+    def _lock_for(self, username: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(username, threading.Lock())
+
+    def _authenticate(self, user, tokens: CachedTokens = None) -> CachedTokens:
+        if tokens is not None and tokens.refresh_token:
+            try:
+                result = self._initiate_auth(user, 'REFRESH_TOKEN_AUTH', {'REFRESH_TOKEN': tokens.refresh_token})
+                self.stats['refresh'] += 1
+                # Cognito does not rotate the refresh token on REFRESH_TOKEN_AUTH
+                return CachedTokens(id_token=result['IdToken'],
+                                    refresh_token=result.get('RefreshToken', tokens.refresh_token),
+                                    expires_at=jwt_expiry(result['IdToken']))
+            except self.cognito_client.exceptions.NotAuthorizedException:
+                log.info("Refresh token of %s rejected, signing in again", user.username)
+
+        result = self._initiate_auth(user, 'USER_PASSWORD_AUTH',
+                                     {'USERNAME': user.username, 'PASSWORD': str(user.password)})
+        self.stats['password'] += 1
+        return CachedTokens(id_token=result['IdToken'],
+                            refresh_token=result.get('RefreshToken'),
+                            expires_at=jwt_expiry(result['IdToken']))
+
+    def _initiate_auth(self, user, flow: str, parameters: dict) -> dict:
+        response = self.cognito_client.admin_initiate_auth(
+            UserPoolId=user.user_pool_id,
+            ClientId=user.client_id,
+            AuthFlow=flow,
+            AuthParameters=parameters
+        )
+        return response['AuthenticationResult']
@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 
@@ -20,4 +21,22 @@ def setup_unit_test():
     log_manager.init_logging(log_level=logging.DEBUG)
 
 
-
+@pytest.fixture(name='sqlite_db')
+def fixture_sqlite_db(monkeypatch, tmp_path):
+    """App database on a SQLite file with the model tables, used by the DAO and service modules."""
+    from lambdas.dao import user_dao  # pylint: disable=import-outside-toplevel
+    from lambdas.models import Base  # pylint: disable=import-outside-toplevel
+    from lambdas.services import user_service  # pylint: disable=import-outside-toplevel
+    from lambdas.services.db_manager import DbManager  # pylint: disable=import-outside-toplevel
+
+    monkeypatch.setenv('DB_APP_SECRET', json.dumps({'engine': 'sqlite', 'dbname': str(tmp_path / 'app.db')}))
+    instances = DbManager._instances
+    DbManager._instances = {}
+    db = DbManager(connection_secret='db-app-secret', db_name='example')
+    monkeypatch.setattr(user_dao, 'db', db)
+    monkeypatch.setattr(user_service, 'db', db)
+    with db:
+        Base.metadata.create_all(db.session.get_bind())
+    yield db
+    db.dispose()
+    DbManager._instances = instances
@@ -0,0 +1,32 @@
+from lambdas import cognito_hooks
+from lambdas.services.db_manager import get_app_db
+
+
+def _token_event(groups: str):
+    return {
+        'triggerSource': 'TokenGeneration_RefreshTokens',
+        'userName': 'testuser',
+        'request': {
+            'userAttributes': {'custom:groups': groups},
+            'groupConfiguration': {'groupsToOverride': [], 'iamRolesToOverride': [], 'preferredRole': None},
+        },
+    }
+
+
+def test_token_generation_does_not_open_db_session(monkeypatch):
+    def fail(*_args, **_kwargs):
+        raise AssertionError("Token generation must not touch the database")
+
+    monkeypatch.setattr(cognito_hooks.user_service, 'create_or_update_user', fail)
+    db = get_app_db()
+
+    event = cognito_hooks.handler(_token_event(f"[{cognito_hooks.PREFIX}SYSADMIN, {cognito_hooks.PREFIX}OTHER]"), None)
+
+    assert event['response']['claimsOverrideDetails']['groupOverrideDetails']['groupsToOverride'] == ['SYSADMIN']
+    assert db.session is None
+    assert db._engine is None
+
+
+def test_parse_custom_groups():
+    assert cognito_hooks.parse_custom_groups(None) == set()
+    assert cognito_hooks.parse_custom_groups(f"[{cognito_hooks.PREFIX}SYSADMIN, USER]") == {'SYSADMIN', 'USER'}
@@ -0,0 +1,110 @@
+import io
+import json
+import logging
+
+from lambdas.utils.common import SensitiveLogFormatter, MaskMatcher, request_masked_log_values, \
+    BufferedLogHandler, JsonLogFormatter, find_event_values, log_invocation
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.LogRecord('test', logging.INFO, __file__, 1, message, None, None)
+
+
+def test_mask_matcher():
+    matcher = MaskMatcher(['secret', 'secret-token', 'a.b', ''])
+    assert matcher.mask('secret-token and secret and a.b but not axb') == '***** and ***** and ***** but not axb'
+    assert MaskMatcher([]).mask('nothing to mask') == 'nothing to mask'
+
+
+def test_sensitive_log_formatter():
+    formatter = SensitiveLogFormatter(logging.Formatter('%(message)s'), ['password1'])
+    assert formatter.format(_record('login with password1')) == 'login with *****'
+
+    formatter.mask_values = ['password1', 1234]
+    assert formatter.format(_record('password1 1234')) == '***** *****'
+
+
+def test_request_masked_log_values():
+    formatter = SensitiveLogFormatter(logging.Formatter('%(message)s'), ['global'])
+    with request_masked_log_values({'token': 'request-token'}):
+        assert formatter.format(_record('global request-token')) == '***** *****'
+    assert formatter.format(_record('global request-token')) == '***** request-token'
+
+
+def test_find_event_values():
+    event = {'action': 'create', 'password': 'p1', 'roles': [{'name': 'app', 'password': 'p2'}, {'name': 'ro'}],
+             'nested': {'password': None}}
+    assert find_event_values(event, ('password',)) == {'password': 'p1', 'roles[0].password': 'p2'}
+    assert not find_event_values(None, ('password',))
+
+
+def test_log_invocation_masks_event_fields():
+    formatter = SensitiveLogFormatter(logging.Formatter('%(message)s'), ['global'])
+
+    @log_invocation(mask_fields=('password',))
+    def handler(event, _):
+        user = event['users'][0]
+        return formatter.format(_record(f"creating {user['username']} with {user['password']}"))
+
+    event = {'users': [{'username': 'alice', 'password': 'hunter2'}]}
+    assert handler(event, None) == 'creating alice with *****'
+    assert formatter.format(_record('hunter2')) == 'hunter2'
+
+
+def _buffered_logger(stream, debug_sample_rate: float) -> (logging.Logger, BufferedLogHandler):
+    handler = BufferedLogHandler(stream, debug_sample_rate=debug_sample_rate)
+    handler.setFormatter(SensitiveLogFormatter(logging.Formatter('%(levelname)s %(message)s'), ['secret']))
+    handler.setLevel(logging.INFO)
+    logger = logging.getLogger('test_buffered')
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, handler
+
+
+def test_buffered_log_handler():
+    stream = io.StringIO()
+    logger, handler = _buffered_logger(stream, debug_sample_rate=0.0)
+
+    handler.start()
+    logger.debug('dropped %s', 'debug')
+    logger.info('kept %s', 'secret')
+    assert stream.getvalue() == ''
+    handler.stop()
+    assert stream.getvalue() == 'INFO kept *****\n'
+
+    stream.truncate(0)
+    stream.seek(0)
+    handler.start()
+    with request_masked_log_values({'token': 'request-token'}):
+        logger.debug('debug request-token')
+    logger.error('failed')
+    handler.stop()
+    assert stream.getvalue() == 'DEBUG debug *****\nERROR failed\n'
+
+
+def test_buffered_log_handler_sampled():
+    stream = io.StringIO()
+    logger, handler = _buffered_logger(stream, debug_sample_rate=1.0)
+    handler.start()
+    logger.debug('sampled')
+    handler.stop()
+    assert stream.getvalue() == 'DEBUG sampled\n'
+
+
+def test_json_log_formatter():
+    record = _record('hello %s')
+    record.args = ('world',)
+    entry = json.loads(JsonLogFormatter().format(record))
+    assert entry['level'] == 'INFO'
+    assert entry['message'] == 'hello world'
+    assert entry['location'].endswith(':1')
+
+
+def test_sensitive_json_log_formatter():
+    secret = 'pa"ss\\wörd'
+    formatter = SensitiveLogFormatter(JsonLogFormatter(), [secret])
+    record = _record('login with %s')
+    record.args = (secret,)
+    entry = json.loads(formatter.format(record))
+    assert entry['message'] == 'login with *****'
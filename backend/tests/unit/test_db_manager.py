@@ -0,0 +1,131 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.pool import NullPool, QueuePool
+
+from lambdas.models import UserAccount
+from lambdas.services import db_manager
+from lambdas.services.db_manager import DbManager
+from lambdas.utils import dt_utils
+from lambdas.utils.common import ServiceException
+
+
+@pytest.fixture(name='db')
+def fixture_db():
+    instances = DbManager._instances
+    DbManager._instances = {}
+    yield
+    DbManager._instances = instances
+
+
+def test_pool_options(monkeypatch):
+    assert db_manager.get_pool_options('null', True, 300) == {'poolclass': NullPool}
+
+    single = db_manager.get_pool_options('single', True, 300)
+    assert single['poolclass'] is QueuePool
+    assert (single['pool_size'], single['max_overflow'], single['pool_pre_ping']) == (1, 0, True)
+
+    monkeypatch.setenv('DB_POOL_SIZE', '3')
+    monkeypatch.setenv('DB_POOL_MAX_OVERFLOW', '2')
+    monkeypatch.setenv('DB_POOL_TIMEOUT', '1.5')
+    queue = db_manager.get_pool_options('queue', False, 60)
+    assert (queue['pool_size'], queue['max_overflow'], queue['pool_timeout'], queue['pool_recycle']) == (3, 2, 1.5, 60)
+
+    with pytest.raises(ServiceException):
+        db_manager.get_pool_options('unknown', True, 300)
+
+
+@pytest.mark.usefixtures('db')
+def test_session_factory_is_built_once(monkeypatch):
+    monkeypatch.setenv('DB_POOL_MODE', 'null')
+    db = DbManager(connection_secret='db-app-secret', db_name='example')
+    with db:
+        engine = db._engine
+        factory = db._session_factory
+        assert isinstance(engine.pool, NullPool)
+    with db:
+        assert db._engine is engine
+        assert db._session_factory is factory
+    assert db.pool_stats.as_dict() == {'connects': 0, 'checkouts': 0, 'reconnects': 0, 'closed': 0}
+
+
+def _create_database(path, name: str):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE instance (name VARCHAR)"))
+        connection.execute(text("INSERT INTO instance (name) VALUES (:name)"), {'name': name})
+    engine.dispose()
+
+
+@pytest.mark.usefixtures('db')
+def test_read_only_sessions_use_the_reader(monkeypatch, tmp_path):
+    # Two database files stand in for the writer and reader instances
+    _create_database(tmp_path / 'writer.db', 'writer')
+    _create_database(tmp_path / 'reader.db', 'reader')
+    monkeypatch.setenv('DB_APP_SECRET', json.dumps({'engine': 'sqlite', 'dbname': str(tmp_path / 'writer.db')}))
+    db = DbManager(connection_secret='db-app-secret', db_name='example', reader_host=str(tmp_path / 'reader.db'))
+
+    def instance(read_only: bool) -> str:
+        with db.session_scope(read_only=read_only):
+            assert db.session.get_bind().get_execution_options().get('postgresql_readonly', False) is read_only
+            return db.session.execute(text("SELECT name FROM instance")).scalar_one()
+
+    assert instance(read_only=False) == 'writer'
+    assert instance(read_only=True) == 'reader'
+
+    calls = []
+
+    @db_manager.with_db_session(read_only=True)
+    def read(value):
+        calls.append(db.session.execute(text("SELECT name FROM instance")).scalar_one())
+        return value
+
+    monkeypatch.setattr(db_manager, 'get_app_db', lambda: db)
+    assert read(1) == 1
+    assert calls == ['reader']
+    db.dispose()
+
+
+@pytest.mark.usefixtures('db')
+def test_read_only_sessions_reject_writes(monkeypatch, tmp_path):
+    _create_database(tmp_path / 'writer.db', 'writer')
+    monkeypatch.setenv('DB_APP_SECRET', json.dumps({'engine': 'sqlite', 'dbname': str(tmp_path / 'writer.db')}))
+    monkeypatch.setenv('DB_POOL_MODE', 'single')
+    db = DbManager(connection_secret='db-app-secret', db_name='example')
+
+    with db.session_scope(read_only=True):
+        with pytest.raises(OperationalError, match='readonly'):
+            db.session.execute(text("INSERT INTO instance (name) VALUES ('read-only')"))
+    # The pooled connection accepts writes again in a read-write session
+    with db.session_scope():
+        db.session.execute(text("INSERT INTO instance (name) VALUES ('read-write')"))
+        db.session.commit()
+    with db.session_scope(read_only=True):
+        assert db.session.execute(text("SELECT count(*) FROM instance")).scalar_one() == 2
+    db.dispose()
+
+
+@pytest.mark.usefixtures('db')
+def test_read_only_sessions_fall_back_to_the_writer(monkeypatch, tmp_path):
+    _create_database(tmp_path / 'writer.db', 'writer')
+    monkeypatch.setenv('DB_APP_SECRET', json.dumps({'engine': 'sqlite', 'dbname': str(tmp_path / 'writer.db')}))
+    db = DbManager(connection_secret='db-app-secret', db_name='example',
+                   reader_host=str(tmp_path / 'missing' / 'reader.db'))
+
+    with db.session_scope(read_only=True):
+        assert db.session.execute(text("SELECT name FROM instance")).scalar_one() == 'writer'
+        assert db.session.get_bind().get_execution_options()['postgresql_readonly'] is True
+    assert db._reader_unavailable_until > 0
+    db.dispose()
+
+
+def test_failed_commit_is_timed(sqlite_db):
+    with dt_utils.invocation_timings() as timings, sqlite_db.session_scope():
+        sqlite_db.session.add_all([UserAccount(user_name='alice', name='A', email='a@example.com'),
+                                   UserAccount(user_name='alice', name='B', email='b@example.com')])
+        with pytest.raises(IntegrityError):
+            sqlite_db.session.commit()
+        assert 'commit_timer' not in sqlite_db.session.info
+    assert timings.phases['commit'][1] == 1
@@ -0,0 +1,38 @@
+import pytest
+
+from lambdas.migrations import db_setup
+from lambdas.utils.validators import ValidationException
+
+
+def test_build_plan_orders_steps_and_reports_unchanged():
+    roles, databases = db_setup.parse_spec({
+        'roles': [{'name': 'Tenant_A', 'password': 'secret'}, {'name': 'tenant_b', 'password': 'secret'},
+                  {'name': 'old_tenant', 'state': 'absent'}],
+        'databases': [{'name': 'tenant_a', 'owner': 'tenant_a'}, {'name': 'tenant_b', 'owner': 'tenant_b'},
+                      {'name': 'shared', 'owner': 'tenant_a'}, {'name': 'old_tenant', 'state': 'absent'}],
+    })
+
+    steps, unchanged = db_setup.build_plan(roles, databases,
+                                           existing_roles={'tenant_b', 'old_tenant'},
+                                           existing_databases={'tenant_b': 'tenant_b', 'shared': 'postgres',
+                                                               'old_tenant': 'old_tenant'})
+
+    assert steps == [
+        {'step': 'create-role', 'name': 'tenant_a'},
+        {'step': 'create-database', 'name': 'tenant_a', 'owner': 'tenant_a'},
+        {'step': 'alter-owner', 'name': 'shared', 'owner': 'tenant_a', 'previousOwner': 'postgres'},
+        {'step': 'drop-database', 'name': 'old_tenant'},
+        {'step': 'drop-role', 'name': 'old_tenant'},
+    ]
+    assert unchanged == {'roles': ['tenant_b'], 'databases': ['tenant_b']}
+
+
+@pytest.mark.parametrize('event', [
+    {},
+    {'roles': [{'name': 'tenant; DROP ROLE postgres', 'password': 'secret'}]},
+    {'roles': [{'name': 'tenant_a'}]},
+    {'databases': [{'name': 'tenant_a', 'owner': 'tenant_a', 'state': 'gone'}]},
+])
+def test_parse_spec_rejects_invalid_payloads(event):
+    with pytest.raises(ValidationException):
+        db_setup.parse_spec(event)
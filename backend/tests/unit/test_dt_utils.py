@@ -0,0 +1,46 @@
+import io
+import json
+
+from lambdas.utils import dt_utils
+
+
+def test_timer_records_phases():
+    @dt_utils.phase('dao.lookup')
+    def lookup():
+        return 'found'
+
+    stream = io.StringIO()
+    with dt_utils.invocation_timings('Example', {'FunctionName': 'users'}, stream=stream) as timings:
+        assert lookup() == 'found'
+        assert lookup() == 'found'
+        with dt_utils.phase('commit'):
+            pass
+        with dt_utils.invocation_timings() as nested:
+            assert nested is timings
+        dt_utils.count('UserCacheHits')
+        dt_utils.count('UserCacheHits', 2)
+
+    metrics = json.loads(stream.getvalue())
+    directive = metrics['_aws']['CloudWatchMetrics'][0]
+    assert directive['Namespace'] == 'Example'
+    assert directive['Dimensions'] == [['FunctionName']]
+    assert [m['Name'] for m in directive['Metrics']] == ['invocation', 'dao.lookup', 'commit', 'UserCacheHits']
+    assert directive['Metrics'][-1]['Unit'] == 'Count'
+    assert metrics['UserCacheHits'] == 3
+    assert metrics['FunctionName'] == 'users'
+    assert metrics['dao.lookup.count'] == 2
+    assert metrics['invocation'] >= metrics['dao.lookup']
+
+
+def test_timer_without_invocation():
+    timer = dt_utils.Timer('Operation', level=None, phase='idle')
+    with timer:
+        pass
+    assert timer.timer_stop >= timer.timer_start
+
+    dt_utils.count('UserCacheHits')
+
+    stream = io.StringIO()
+    with dt_utils.invocation_timings(stream=stream):
+        pass
+    assert stream.getvalue() == ''
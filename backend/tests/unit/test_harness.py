@@ -0,0 +1,16 @@
+from benchmarks.harness import percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(10))
+    assert percentile(values, 50) == 4
+    assert percentile(values, 90) == 8
+    assert percentile(values, 91) == 9
+    assert percentile(values, 0) == 0
+    assert percentile(values, 100) == 9
+
+    samples = list(range(1000))
+    assert percentile(samples, 99) == 989
+    assert percentile(samples, 99.9) == 998
+    assert percentile(list(range(10000)), 99.99) == 9998
+    assert percentile([], 50) == 0.0
@@ -0,0 +1,24 @@
+from tools.import_report import package_times
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+import time:       300 |        300 |       sqlalchemy.sql
+import time:       200 |        500 |     sqlalchemy
+import time:        50 |         50 |       json
+import time:       100 |        650 |   lambdas.models
+import time:        40 |         40 |   lambdas.utils
+import time:        10 |        700 | users
+"""
+
+
+def test_package_times():
+    total_ms, packages = package_times(IMPORTTIME_OUTPUT, 'users')
+    assert total_ms == 0.7
+    times = {p.name: (round(p.self_ms, 3), round(p.cumulative_ms, 3)) for p in packages}
+    assert times == {
+        'sqlalchemy': (0.5, 0.5),
+        'lambdas': (0.14, 0.69),
+        'json': (0.05, 0.05),
+        'users': (0.01, 0.7),
+    }
+    assert [p.name for p in packages] == ['sqlalchemy', 'lambdas', 'json', 'users']
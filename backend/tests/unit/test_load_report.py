@@ -0,0 +1,20 @@
+from tools.load_report import Sample, build_report
+
+
+def test_build_report():
+    # 1000 getUser requests of 1..1000 ms, two of them failed, and one dropped request
+    samples = [Sample(query='getUser', started=i / 1000, latency=(i + 1) / 1000,
+                      error='Unauthorized' if i in (10, 20) else None) for i in range(1000)]
+    samples.append(Sample(query='-', started=0.5, latency=0.0, error='Dropped'))
+
+    report = build_report(samples, 'rps', 1000, 1, interval=1.0)
+
+    assert report.requests == 1001
+    assert report.errors == {'Unauthorized': 2, 'Dropped': 1}
+    assert report.latency_ms == {'p50': 500.0, 'p90': 900.0, 'p99': 990.0, 'p99.9': 999.0, 'max': 1000.0}
+    assert list(report.per_query) == ['getUser']
+    assert report.per_query['getUser']['requests'] == 1000
+    assert report.per_query['getUser']['errors'] == 2
+    # Completion times run from 1 ms to 2 s, the dropped request falls in the first second
+    assert [point['throughput'] for point in report.timeline] == [501.0, 500.0]
+    assert sum(point['errors'] for point in report.timeline) == 3
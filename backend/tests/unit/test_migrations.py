@@ -0,0 +1,82 @@
+import pytest
+from alembic.config import Config
+from alembic.operations import Operations
+from alembic.runtime.environment import EnvironmentContext
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from lambdas.migrations import helpers, migrations
+
+
+def test_head_file_matches_migration_scripts():
+    # Run 'invoke migrationhead' after adding a migration
+    assert migrations.read_script_head() == migrations.get_script_head()
+
+
+@pytest.fixture
+def migration_context():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, value INTEGER)"))
+        connection.execute(text("INSERT INTO item (id, value) VALUES (:id, NULL)"), [{'id': i} for i in range(25)])
+        context = MigrationContext.configure(connection, environment_context=EnvironmentContext(Config(), None))
+        with Operations.context(context):
+            yield context
+
+
+def test_backfill_updates_in_batches(migration_context, monkeypatch):
+    pauses = []
+    monkeypatch.setattr(helpers.time, 'sleep', pauses.append)
+
+    assert helpers.backfill('item', 'value = id * 2', 'value IS NULL', batch_size=10, pause=0.5) == 25
+    assert pauses == [0.5, 0.5]
+    assert migration_context.connection.execute(text("SELECT count(*) FROM item WHERE value = id * 2")).scalar() == 25
+
+
+def test_dry_run_only_records_estimates(migration_context):
+    migration_context.config.attributes['dry_run'] = True
+    migration_context.connection.execute(text("UPDATE item SET value = 1 WHERE id < 5"))
+
+    assert helpers.backfill('item', 'value = 0', 'value IS NULL') == 0
+    helpers.create_index_concurrently('ix_item_value', 'item', ['value'])
+
+    assert migration_context.config.attributes['estimates'] == [
+        {'operation': 'backfill', 'table': 'item', 'rows': 20},
+        {'operation': 'create_index', 'table': 'item', 'rows': 25, 'index': 'ix_item_value'},
+    ]
+    assert migration_context.connection.execute(text("SELECT count(*) FROM item WHERE value = 0")).scalar() == 0
+
+
+def test_run_with_lock_timeout_retries(migration_context, monkeypatch):
+    class LockNotAvailable(Exception):
+        pgcode = helpers.LOCK_NOT_AVAILABLE
+
+    attempts = []
+    monkeypatch.setattr(helpers.time, 'sleep', lambda _: None)
+
+    def operation():
+        attempts.append(len(attempts))
+        if len(attempts) < 3:
+            raise OperationalError("ALTER TABLE item", {}, LockNotAvailable())
+
+    helpers.run_with_lock_timeout(operation, 'item', retries=5)
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(OperationalError):
+        helpers.run_with_lock_timeout(operation, 'item', retries=2)
+
+
+def test_check_unique(migration_context):
+    helpers.check_unique('item', 'id % 100')
+    migration_context.connection.execute(text("INSERT INTO item (id, value) VALUES (100, NULL), (101, NULL)"))
+
+    with pytest.raises(RuntimeError, match=r"2 values of id % 100 .*: 0 \(2 rows\), 1 \(2 rows\)"):
+        helpers.check_unique('item', 'id % 100')
+
+    migration_context.config.attributes['dry_run'] = True
+    helpers.check_unique('item', 'id % 100')
+    assert migration_context.config.attributes['estimates'] == [
+        {'operation': 'duplicates', 'table': 'item', 'rows': 2, 'expression': 'id % 100'},
+    ]
@@ -0,0 +1,44 @@
+from uuid import uuid4
+
+from lambdas import models
+from lambdas.models import UserAccount
+
+
+def _user():
+    return UserAccount(id=uuid4(), user_name='abc_def', name='Abc Def', email='abc@example.com.invalid')
+
+
+def test_to_dict():
+    user = _user()
+    assert user.to_dict() == {
+        'id': str(user.id),
+        'userName': 'abc_def',
+        'name': 'Abc Def',
+        'email': 'abc@example.com.invalid',
+    }
+
+
+def test_model_to_dict_options():
+    user = _user()
+    assert user.model_to_dict(show=['name'], camel_case=False, serialize=False, type_name='UserAccount') == {
+        '__typename': 'UserAccount',
+        'id': user.id,
+        'name': 'Abc Def',
+    }
+    assert user.model_to_dict(show=['user_name', 'email'], _hide=['email']) == {
+        'id': str(user.id),
+        'userName': 'abc_def',
+    }
+
+
+def test_serialization_plan_is_cached():
+    _user().to_dict()
+    plan_count = len(models._PLANS)
+    for _ in range(3):
+        _user().to_dict()
+    assert len(models._PLANS) == plan_count
+
+
+def test_camel_case_keys_are_built_at_mapper_configuration():
+    _user()
+    assert UserAccount._camel_case_keys == {'id': 'id', 'user_name': 'userName', 'name': 'name', 'email': 'email'}
@@ -0,0 +1,61 @@
+import json
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from lambdas.services import secrets_service
+
+SECRET_ARN = 'arn:aws:secretsmanager:us-east-1:000000000000:secret:test-secret'
+
+
+@pytest.fixture(name='secrets_manager')
+def fixture_secrets_manager(monkeypatch):
+    monkeypatch.setenv('AWS_REGION', 'us-east-1')
+    monkeypatch.setenv('TEST_SECRET_ARN', SECRET_ARN)
+    monkeypatch.delenv('TEST_SECRET', raising=False)
+
+    client = boto3.client('secretsmanager', region_name='us-east-1',
+                          aws_access_key_id='test', aws_secret_access_key='test')
+    monkeypatch.setattr(secrets_service, '_clients', {'us-east-1': client})
+    secrets_service.invalidate_secret()
+    with Stubber(client) as stubber:
+        yield stubber
+    secrets_service.invalidate_secret()
+
+
+def _add_response(stubber: Stubber, password: str):
+    stubber.add_response('get_secret_value',
+                         {'ARN': SECRET_ARN, 'SecretString': json.dumps({'username': 'example', 'password': password})},
+                         {'SecretId': SECRET_ARN})
+
+
+def test_secret_is_cached(secrets_manager):
+    _add_response(secrets_manager, 'first')
+
+    assert secrets_service.get_secret_value('test-secret', result_type=dict)['password'] == 'first'
+    assert secrets_service.get_secret_value('test-secret', result_type=dict)['password'] == 'first'
+    secrets_manager.assert_no_pending_responses()
+
+
+def test_secret_force_refresh(secrets_manager):
+    _add_response(secrets_manager, 'first')
+    _add_response(secrets_manager, 'rotated')
+
+    assert secrets_service.get_secret_value('test-secret', result_type=dict)['password'] == 'first'
+    refreshed = secrets_service.get_secret_value('test-secret', result_type=dict, force_refresh=True)
+    assert refreshed['password'] == 'rotated'
+    assert secrets_service.get_secret_value('test-secret', result_type=dict)['password'] == 'rotated'
+    secrets_manager.assert_no_pending_responses()
+
+
+def test_secret_expires(secrets_manager, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(secrets_service._secret_cache, 'clock', lambda: now[0])
+    _add_response(secrets_manager, 'first')
+    _add_response(secrets_manager, 'second')
+
+    assert secrets_service.get_secret_value('test-secret') == json.dumps({'username': 'example', 'password': 'first'})
+    now[0] += secrets_service.SECRETS_CACHE_TTL + 1
+    assert secrets_service.get_secret_value('test-secret', result_type=dict)['password'] == 'second'
+    secrets_manager.assert_no_pending_responses()
@@ -0,0 +1,47 @@
+import decimal
+import json
+from collections import OrderedDict
+from datetime import datetime, date, timezone
+from enum import Enum
+from uuid import uuid4
+
+from lambdas.utils import serialization
+from lambdas.utils.common import init_json_serialisation, serialize_object
+
+
+class Color(Enum):
+    RED = 1
+
+
+class LocalDate(date):
+    pass
+
+
+def test_serialize_object():
+    uuid = uuid4()
+    assert serialize_object(uuid) == str(uuid)
+    assert serialize_object(datetime(2024, 1, 2, 3, 4, 5)) == '2024-01-02T03:04:05+00:00'
+    assert serialize_object(date(2024, 1, 2)) == '2024-01-02'
+    assert serialize_object(LocalDate(2024, 1, 2)) == '2024-01-02'
+    assert serialize_object(Color.RED) == 'RED'
+    assert serialize_object(decimal.Decimal('1.5')) == 1.5
+    assert serialize_object(OrderedDict(a=1)) == {'a': 1}
+    assert serialize_object(12) == '12'
+
+
+def test_registry_resolves_base_class_once():
+    registry = serialization.TypeRegistry()
+    registry.register(date, date.isoformat)
+    assert registry.lookup(LocalDate) is date.isoformat
+    assert registry.lookup(int) is None
+    registry.register(LocalDate, str)
+    assert registry.lookup(LocalDate) is str
+
+
+def test_json_encoding_uses_the_registry():
+    init_json_serialisation()
+    uuid = uuid4()
+    payload = {'id': uuid, 'created': datetime(2024, 1, 2, tzinfo=timezone.utc), 'amount': decimal.Decimal('2.5'),
+               'items': [date(2024, 1, 2)], 'color': Color.RED}
+    assert json.loads(json.dumps(payload)) == {'id': str(uuid), 'created': '2024-01-02T00:00:00+00:00',
+                                               'amount': 2.5, 'items': ['2024-01-02'], 'color': 'RED'}
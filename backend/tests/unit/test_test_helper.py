@@ -0,0 +1,54 @@
+import threading
+
+from lambdas.dev import test_helper
+
+
+class FakeCognito:
+    class exceptions:  # pylint: disable=invalid-name
+        class UsernameExistsException(Exception):
+            pass
+
+        class UserNotFoundException(Exception):
+            pass
+
+    def __init__(self, existing: set):
+        self.existing = existing
+        self.lock = threading.Lock()
+
+    def admin_create_user(self, Username, **_):  # pylint: disable=invalid-name
+        if Username == 'broken':
+            raise RuntimeError('throttled')
+        with self.lock:
+            if Username in self.existing:
+                raise self.exceptions.UsernameExistsException()
+            self.existing.add(Username)
+
+    def admin_set_user_password(self, **_):
+        pass
+
+    def admin_delete_user(self, Username, **_):  # pylint: disable=invalid-name
+        with self.lock:
+            if Username not in self.existing:
+                raise self.exceptions.UserNotFoundException()
+            self.existing.remove(Username)
+
+
+def test_batch_create_and_delete(monkeypatch):
+    cognito = FakeCognito(existing={'existing'})
+    written = []
+    monkeypatch.setattr(test_helper, 'get_aws_client', lambda: cognito)
+    monkeypatch.setattr(test_helper.user_service, 'create_or_update_users', written.extend)
+    monkeypatch.setattr(test_helper.user_service, 'delete_users', written.extend)
+
+    users = [{'username': name, 'email': f"{name}@example.com.invalid", 'password': 'Secret12!'}
+             for name in ('new', 'existing', 'broken')]
+    results = test_helper.create_users(users)
+
+    assert [(r['username'], r['status']) for r in results] == [('new', 'Created'), ('existing', 'Exists'),
+                                                               ('broken', 'Failed')]
+    assert [row['user_name'] for row in written] == ['new', 'existing']
+
+    written.clear()
+    results = test_helper.delete_users(['new', 'missing'])
+    assert [(r['username'], r['status']) for r in results] == [('new', 'Deleted'), ('missing', 'NotFound')]
+    assert written == ['new', 'missing']
@@ -0,0 +1,152 @@
+import base64
+import json
+import threading
+from dataclasses import dataclass
+
+import pytest
+
+from tests.integration.token_cache import TokenCache, jwt_expiry
+
+TOKEN_LIFETIME = 3600
+
+
+class NotAuthorizedException(Exception):
+    pass
+
+
+@dataclass
+class User:
+    username: str
+    password: str = 'password'
+    user_pool_id: str = 'pool'
+    client_id: str = 'client'
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeCognitoClient:
+    """admin_initiate_auth issuing tokens that expire TOKEN_LIFETIME seconds after the clock's time."""
+
+    exceptions = type('Exceptions', (), {'NotAuthorizedException': NotAuthorizedException})
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.calls = []
+        self.reject_refresh = False
+        self.called = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def admin_initiate_auth(self, UserPoolId, ClientId, AuthFlow, AuthParameters):  # pylint: disable=invalid-name
+        self.calls.append(AuthFlow)
+        self.called.set()
+        assert self.release.wait(timeout=5)
+        if AuthFlow == 'REFRESH_TOKEN_AUTH' and self.reject_refresh:
+            raise NotAuthorizedException()
+        issued = len(self.calls)
+        result = {'IdToken': _jwt(self.clock() + TOKEN_LIFETIME, issued)}
+        if AuthFlow == 'USER_PASSWORD_AUTH':
+            result['RefreshToken'] = f"refresh-{issued}"
+        return {'AuthenticationResult': result}
+
+
+def _jwt(exp: float, issued: int) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': exp, 'n': issued}).encode()).decode().rstrip('=')
+    return f"header.{payload}.signature"
+
+
+@pytest.fixture(name='clock')
+def fixture_clock():
+    return FakeClock()
+
+
+@pytest.fixture(name='client')
+def fixture_client(clock):
+    return FakeCognitoClient(clock)
+
+
+@pytest.fixture(name='cache')
+def fixture_cache(client, clock):
+    cache = TokenCache(client, refresh_ahead=60, clock=clock)
+    yield cache
+    cache.close()
+
+
+def test_tokens_are_cached_until_the_refresh_window(cache, client, clock):
+    user = User('alice')
+    token = cache.get_token(user)
+    assert jwt_expiry(token) == clock() + TOKEN_LIFETIME
+
+    clock.now += TOKEN_LIFETIME - 61
+    assert cache.get_token(user) == token
+    assert client.calls == ['USER_PASSWORD_AUTH']
+
+
+def test_tokens_are_renewed_in_the_background(cache, client, clock):
+    user = User('alice')
+    token = cache.get_token(user)
+
+    clock.now += TOKEN_LIFETIME - 30
+    client.called.clear()
+    client.release.clear()
+    # Within refresh_ahead the cached token is returned at once, one renewal is started however often it is asked for
+    assert cache.get_token(user) == token
+    assert client.called.wait(timeout=5)
+    assert cache.get_token(user) == token
+    client.release.set()
+    cache.close()
+
+    renewed = cache.get_token(user)
+    assert renewed != token
+    assert jwt_expiry(renewed) == clock() + TOKEN_LIFETIME
+    assert client.calls == ['USER_PASSWORD_AUTH', 'REFRESH_TOKEN_AUTH']
+    assert cache.stats == {'password': 1, 'refresh': 1}
+
+
+def test_expired_tokens_are_renewed_once_for_concurrent_callers(cache, client, clock):
+    user = User('alice')
+    cache.get_token(user)
+
+    clock.now += TOKEN_LIFETIME
+    client.called.clear()
+    client.release.clear()
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(cache.get_token(user))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    # The callers queue behind the first renewal
+    assert client.called.wait(timeout=5)
+    client.release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(tokens) == 8 and len(set(tokens)) == 1
+    assert client.calls == ['USER_PASSWORD_AUTH', 'REFRESH_TOKEN_AUTH']
+
+
+def test_rejected_refresh_token_falls_back_to_the_password(cache, client, clock):
+    user = User('alice')
+    cache.get_token(user)
+
+    clock.now += TOKEN_LIFETIME
+    client.reject_refresh = True
+    token = cache.get_token(user)
+
+    assert jwt_expiry(token) == clock() + TOKEN_LIFETIME
+    assert client.calls == ['USER_PASSWORD_AUTH', 'REFRESH_TOKEN_AUTH', 'USER_PASSWORD_AUTH']
+    assert cache.stats == {'password': 2}
+
+
+def test_tokens_are_cached_per_user(cache, client):
+    assert cache.get_token(User('alice')) != cache.get_token(User('bob'))
+    cache.invalidate('alice')
+    cache.get_token(User('alice'))
+    cache.get_token(User('bob'))
+    assert client.calls == ['USER_PASSWORD_AUTH'] * 3
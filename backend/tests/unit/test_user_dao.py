@@ -0,0 +1,65 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from lambdas.dao import user_dao
+from lambdas.models import UserAccount
+from lambdas.services import user_service
+
+
+def test_user_names_are_unique_case_insensitively(sqlite_db):
+    with sqlite_db as db:
+        assert user_dao.upsert_user('alice', 'Alice', 'alice@example.com.invalid') is True
+        assert user_dao.upsert_user('Alice', 'Alice A', 'alice@example.com.invalid') is True
+        db.session.commit()
+
+        assert db.session.query(UserAccount).count() == 1
+        user = user_dao.find_user('ALICE')
+        assert (user.user_name, user.name) == ('alice', 'Alice A')
+        assert [user.user_name for user in user_dao.find_users(['Alice', 'aLiCe'])] == ['alice']
+
+        db.session.add(UserAccount(user_name='ALICE', name='Alice', email='alice@example.com.invalid'))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+
+def test_upsert_user_only_writes_changes(sqlite_db):
+    with sqlite_db as db:
+        assert user_dao.upsert_user('bob', 'Bob', 'bob@example.com.invalid') is True
+        assert user_dao.upsert_user('bob', 'Bob', 'bob@example.com.invalid') is False
+        assert user_dao.upsert_user('bob', 'Bob B', 'bob@example.com.invalid') is True
+        assert user_dao.upsert_user('bob', 'Bob B', 'bob.b@example.com.invalid') is True
+        db.session.commit()
+
+        user = user_dao.find_user('bob')
+        assert (user.name, user.email) == ('Bob B', 'bob.b@example.com.invalid')
+
+
+def test_upsert_users_counts_written_rows(sqlite_db):
+    with sqlite_db as db:
+        assert user_dao.upsert_users([]) == 0
+        assert user_dao.upsert_users([{'user_name': 'carol', 'name': 'Carol', 'email': 'carol@example.com.invalid'},
+                                      {'user_name': 'dave', 'name': 'Dave', 'email': 'dave@example.com.invalid'}]) == 2
+        assert user_dao.upsert_users([{'user_name': 'carol', 'name': 'Carol', 'email': 'carol@example.com.invalid'},
+                                      {'user_name': 'dave', 'name': 'David', 'email': 'dave@example.com.invalid'}]) == 1
+        db.session.commit()
+        assert db.session.query(UserAccount).count() == 2
+
+
+def test_import_merges_staged_rows(sqlite_db):
+    with sqlite_db as db:
+        user_dao.upsert_users([{'user_name': 'alice', 'name': 'Alice', 'email': 'alice@example.com.invalid'},
+                               {'user_name': 'bob', 'name': 'Bob', 'email': 'bob@example.com.invalid'}])
+        db.session.commit()
+
+        rows = [{'line': line, 'id': uuid4(), 'user_name': user_name, 'name': name, 'email': email}
+                for line, (user_name, name, email) in enumerate([
+                    ('ALICE', 'Alice A', 'alice@example.com.invalid'),
+                    ('bob', 'Bob', 'bob@example.com.invalid'),
+                    ('carol', 'Carol', 'carol@example.com.invalid'),
+                ], start=1)]
+        assert user_service.import_users(rows) == {'inserted': 1, 'updated': 1, 'unchanged': 1}
+
+        users = {user.user_name: user.name for user in db.session.query(UserAccount)}
+        assert users == {'alice': 'Alice A', 'bob': 'Bob', 'carol': 'Carol'}
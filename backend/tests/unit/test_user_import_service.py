@@ -0,0 +1,40 @@
+import pytest
+
+from lambdas.services import user_import_service
+from lambdas.services.user_import_service import ImportValidator
+from lambdas.utils.validators import ValidationException
+
+
+def test_parse_and_validate_csv():
+    lines = ['user_name,name,email',
+             'alice,Alice,alice@example.com',
+             'ALICE,Alice,alice@example.com',
+             'bob,Bob,not-an-email',
+             'carol,,carol@example.com',
+             'dave,Dave,dave@example.com,extra']
+    validator = ImportValidator()
+    rows = list(validator.validate(user_import_service.parse_csv(lines)))
+
+    assert [(row['line'], row['user_name']) for row in rows] == [(2, 'alice')]
+    assert validator.rejected == 4
+    assert validator.errors == [{'line': 3, 'error': 'Duplicate user_name'},
+                                {'line': 4, 'error': 'Invalid email'},
+                                {'line': 5, 'error': "Field 'name' is required"},
+                                {'line': 6, 'error': 'Too many columns'}]
+
+
+def test_parse_and_validate_jsonl():
+    lines = ['{"user_name": " bob ", "name": "Bob", "email": "bob@example.com"}', '', '{broken', '[1]']
+    validator = ImportValidator(max_reported_errors=1)
+    rows = list(validator.validate(user_import_service.parse_jsonl(lines)))
+
+    assert [(row['user_name'], row['name'], row['email']) for row in rows] == [('bob', 'Bob', 'bob@example.com')]
+    assert validator.rejected == 2
+    assert validator.errors == [{'line': 3, 'error': 'Invalid JSON'}]
+
+
+def test_get_format():
+    assert user_import_service.get_format({'key': 'imports/users.CSV'}) == 'csv'
+    assert user_import_service.get_format({'key': 'imports/users.jsonl'}) == 'jsonl'
+    with pytest.raises(ValidationException):
+        user_import_service.get_format({'format': 'xml'})
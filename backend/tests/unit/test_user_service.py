@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import create_engine, event
+
+from lambdas.dao import user_dao
+from lambdas.models import Base, UserAccount
+from lambdas.services import user_service
+from lambdas.utils import dt_utils
+from lambdas.utils.cache import TTLCache
+from lambdas.utils.common import ServiceException
+
+
+def test_find_users_by_name_is_case_insensitive(monkeypatch):
+    alice = UserAccount(user_name='Alice', name='Alice', email='alice@example.com.invalid')
+    monkeypatch.setattr(user_service.user_dao, 'find_users', lambda user_names: [alice])
+
+    assert user_service.find_users_by_name(['alice', 'ALICE', 'bob']) == {'alice': alice, 'ALICE': alice}
+
+
+def test_list_users_pages(monkeypatch):
+    users = [UserAccount(user_name=f"user_{i}", name='User', email='user@example.com.invalid') for i in range(3)]
+    requested = []
+
+    def iter_users(after, limit):
+        requested.append((after, limit))
+        return iter(users[:limit])
+
+    monkeypatch.setattr(user_service.user_dao, 'iter_users', iter_users)
+
+    page = user_service.list_users(limit=2)
+    assert [item['userName'] for item in page['items']] == ['user_0', 'user_1']
+    assert page['nextToken'] == 'user_1'
+    assert user_service.list_users(after='user_1', limit=3)['nextToken'] is None
+    assert requested == [(None, 3), ('user_1', 4)]
+
+    with pytest.raises(ServiceException):
+        user_service.list_users(limit=0)
+
+
+@pytest.fixture(name='find_user_calls')
+def fixture_find_user_calls(monkeypatch, sqlite_db):
+    with sqlite_db as db:
+        user_dao.upsert_user('alice', 'Alice', 'alice@example.com.invalid')
+        db.session.commit()
+
+    calls = []
+    find_user = user_dao.find_user
+
+    def counting_find_user(user_name):
+        calls.append(user_name)
+        return find_user(user_name)
+
+    monkeypatch.setattr(user_service.user_dao, 'find_user', counting_find_user)
+    return calls
+
+
+def test_find_authorized_user_caches_detached_snapshots(monkeypatch, sqlite_db, find_user_calls):
+    monkeypatch.setattr(user_service, '_user_cache', TTLCache(ttl=60))
+
+    with dt_utils.invocation_timings() as timings, sqlite_db as db:
+        assert user_service.find_authorized_user('alice').name == 'Alice'
+        assert user_service.find_authorized_user('nobody') is None
+        assert user_service.find_authorized_user('alice').name == 'Alice'
+    assert timings.counters == {'UserCacheMisses': 2, 'UserCacheHits': 1}
+
+    # A later invocation gets the snapshot merged into its own session without a query
+    with sqlite_db as db:
+        statements = []
+        event.listen(db.session.get_bind(), 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        user = user_service.find_authorized_user('alice')
+        assert user in db.session
+        assert user.to_dict()['email'] == 'alice@example.com.invalid'
+        assert not db.session.dirty
+        assert statements == []
+
+    assert find_user_calls == ['alice', 'nobody']
+    assert user_service.user_cache_stats()['hits'] == 2
+
+
+def test_find_authorized_user_without_cache(monkeypatch, sqlite_db, find_user_calls):
+    monkeypatch.setattr(user_service, '_user_cache', TTLCache(ttl=0))
+
+    for _ in range(2):
+        with sqlite_db:
+            assert user_service.find_authorized_user('alice').user_name == 'alice'
+    assert find_user_calls == ['alice', 'alice']
+
+
+def test_find_authorized_user_falls_back_to_the_writer(monkeypatch, tmp_path, sqlite_db, find_user_calls):
+    monkeypatch.setattr(user_service, '_user_cache', TTLCache(ttl=0))
+    # An empty reader database stands in for a replica that has not caught up with the sign-up yet
+    reader = create_engine(f"sqlite:///{tmp_path / 'reader.db'}")
+    Base.metadata.create_all(reader)
+    reader.dispose()
+    sqlite_db.dispose()
+    monkeypatch.setattr(sqlite_db, '_reader_host', str(tmp_path / 'reader.db'))
+
+    with sqlite_db.session_scope(read_only=True) as db:
+        assert db.reads_from_reader()
+        user = user_service.find_authorized_user('alice')
+        assert user.name == 'Alice'
+        assert user in db.session
+        assert user_service.find_authorized_user('nobody') is None
+        assert db.reads_from_reader()
+    assert find_user_calls == ['alice', 'nobody']
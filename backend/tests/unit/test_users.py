@@ -0,0 +1,73 @@
+import pytest
+
+from lambdas import users
+from lambdas.models import UserAccount
+
+
+def _event(field_name: str, identity: str = None, **arguments):
+    event = {'info': {'fieldName': field_name}, 'arguments': arguments}
+    if identity is not None:
+        event['identity'] = {'username': identity}
+    return event
+
+
+@pytest.fixture(name='accounts')
+def fixture_accounts(monkeypatch):
+    accounts = {name: UserAccount(user_name=name, name=name.title(), email=f"{name}@example.com.invalid")
+                for name in ('alice', 'bob')}
+    requested = []
+
+    def find_users_by_name(user_names):
+        requested.append(set(user_names))
+        return {name: accounts[name] for name in user_names if name in accounts}
+
+    monkeypatch.setattr(users.user_service, 'find_users_by_name', find_users_by_name)
+    return requested
+
+
+def test_batch_results_follow_request_order(accounts):
+    results = users.batch_handler([
+        _event('getUser', 'alice', userName='bob'),
+        _event('user', 'bob'),
+        _event('user', 'alice'),
+    ])
+
+    assert [result['data']['userName'] for result in results] == ['bob', 'bob', 'alice']
+    assert all('errorMessage' not in result for result in results)
+    # Identities and requested users are loaded with one lookup
+    assert accounts == [{'alice', 'bob'}]
+
+
+def test_batch_item_errors_do_not_fail_the_batch(accounts):
+    results = users.batch_handler([
+        _event('user'),
+        _event('user', 'mallory'),
+        _event('getUser', 'alice', userName='nobody'),
+        _event('deleteUser', 'alice'),
+        _event('user', 'alice'),
+    ])
+
+    assert [(result['data'], result.get('errorMessage'), result.get('errorType')) for result in results[:4]] == [
+        (None, 'Unauthorized', 'ServiceException'),
+        (None, 'Unauthorized', 'ServiceException'),
+        (None, 'Bad Request', 'ServiceException'),
+        (None, "Unknown request: 'deleteUser'", 'ServiceException'),
+    ]
+    assert results[4]['data']['userName'] == 'alice'
+
+
+def test_batch_identities_missing_on_the_reader_are_read_from_the_writer(monkeypatch, accounts):
+    carol = UserAccount(user_name='carol', name='Carol', email='carol@example.com.invalid')
+    requested = []
+
+    def find_users_on_writer(user_names):
+        requested.append(set(user_names))
+        return {name: carol for name in user_names if name == 'carol'}
+
+    monkeypatch.setattr(users.user_service, 'find_users_on_writer', find_users_on_writer)
+    results = users.batch_handler([_event('user', 'carol'), _event('getUser', 'alice', userName='nobody')])
+
+    assert results[0]['data']['userName'] == 'carol'
+    assert results[1]['errorMessage'] == 'Bad Request'
+    # Only caller identities are retried on the writer
+    assert requested == [{'carol'}]
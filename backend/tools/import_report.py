@@ -0,0 +1,150 @@
+"""Report per-module import time for every Lambda handler listed in resources/functions.yml.
+
+Each handler module is imported in a fresh interpreter with ``python -X importtime``. The report lists the
+total import time and the slowest top-level imports so init duration regressions show up before deploy.
+
+Run from the backend directory: ``python -m tools.import_report [--top 10] [--json] [--budget-ms 500]``
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass, asdict, field
+
+FUNCTIONS_FILE = 'resources/functions.yml'
+
+HANDLER_PATTERN = re.compile(r'^(?P<function>[A-Za-z0-9_-]+):\s*$|^\s+handler:\s*(?P<handler>\S+)\s*$')
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|'
+                                 r'(?P<indent>\s+)(?P<name>\S+)')
+
+# Local stand-in values so importing a handler never reaches AWS
+IMPORT_ENV = {
+    'PYTHONPATH': './:./lambdas',
+    'DB_APP_SECRET': '{"username": "example", "password": "example", "host": "localhost", "port": 5432}',
+    'DB_MASTER_SECRET': '{"username": "postgres", "password": "postgres", "host": "localhost", "port": 5432}',
+    'LOG_LEVEL': 'WARNING',
+}
+
+
+@dataclass
+class ModuleTime:
+    name: str
+    self_ms: float
+    cumulative_ms: float
+
+
+@dataclass
+class HandlerReport:
+    function: str
+    module: str
+    total_ms: float = 0.0
+    error: str = None
+    packages: list[ModuleTime] = field(default_factory=list)
+
+
+def read_handlers(path: str = FUNCTIONS_FILE) -> dict[str, str]:
+    handlers = {}
+    function = None
+    with open(path, 'r', encoding='utf8') as file:
+        for line in file:
+            match = HANDLER_PATTERN.match(line.rstrip('\n'))
+            if match is None:
+                continue
+            if match.group('function'):
+                function = match.group('function')
+            elif function is not None:
+                handlers[function] = match.group('handler').rsplit('.', 1)[0].replace('/', '.')
+    return handlers
+
+
+def measure(function: str, module: str) -> HandlerReport:
+    env = os.environ | IMPORT_ENV
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            env=env, capture_output=True, text=True, check=False)
+    report = HandlerReport(function=function, module=module)
+    if result.returncode != 0:
+        report.error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed'
+
+    report.total_ms, report.packages = package_times(result.stderr, module)
+    return report
+
+
+def package_times(importtime_output: str, module: str) -> tuple[float, list[ModuleTime]]:
+    """Total import time of ``module`` and the time spent in each package it imports, slowest first.
+
+    A package's cumulative time adds up the cumulative column of its modules imported from another package, so it
+    includes the packages it pulls in itself.
+    """
+    # -X importtime prints children before their parent, so everything between the previous top-level entry
+    # (interpreter start-up such as site or encodings) and the handler module itself belongs to the handler.
+    total_ms = 0.0
+    handler_modules = []
+    for line in importtime_output.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            continue
+        depth = len(match.group('indent'))
+        entry = (match.group('name'), depth, int(match.group('self')), int(match.group('cumulative')))
+        if depth == 1 and entry[0] == module:
+            total_ms = entry[3] / 1000
+            handler_modules.append(entry)
+            break
+        if depth == 1:
+            handler_modules = []
+            continue
+        handler_modules.append(entry)
+
+    packages: dict[str, ModuleTime] = {}
+    # Walking backwards every module comes after its parent, the innermost shallower entry seen
+    parents = []
+    for name, depth, self_us, cumulative_us in reversed(handler_modules):
+        while parents and parents[-1][1] >= depth:
+            parents.pop()
+        package = name.split('.', 1)[0]
+        package_time = packages.setdefault(package, ModuleTime(name=package, self_ms=0.0, cumulative_ms=0.0))
+        package_time.self_ms += self_us / 1000
+        if not parents or parents[-1][0] != package:
+            package_time.cumulative_ms += cumulative_us / 1000
+        parents.append((package, depth))
+    return total_ms, sorted(packages.values(), key=lambda m: m.self_ms, reverse=True)
+
+
+def print_report(reports: list[HandlerReport], top: int):
+    for report in reports:
+        status = f" FAILED: {report.error}" if report.error else ''
+        print(f"{report.function} ({report.module}): {report.total_ms:.1f} ms{status}")
+        for package_time in report.packages[:top]:
+            print(f"    {package_time.self_ms:9.1f} ms  {package_time.cumulative_ms:9.1f} ms cumulative  "
+                  f"{package_time.name}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest top-level imports to show')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Exit with an error if any handler import exceeds this many milliseconds')
+    parser.add_argument('functions', nargs='*', help='Limit the report to these functions')
+    args = parser.parse_args(argv)
+
+    handlers = read_handlers()
+    reports = [measure(function, module) for function, module in handlers.items()
+               if not args.functions or function in args.functions]
+
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+    else:
+        print_report(reports, args.top)
+
+    if args.budget_ms is not None:
+        over_budget = [r.function for r in reports if r.error or r.total_ms > args.budget_ms]
+        if over_budget:
+            print(f"Import budget of {args.budget_ms} ms exceeded by: {', '.join(over_budget)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
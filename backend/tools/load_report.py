@@ -0,0 +1,72 @@
+"""Latency and throughput report of a load test run, see tools.load_test."""
+from collections import Counter
+from dataclasses import dataclass, field
+
+from benchmarks.harness import percentile
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+@dataclass
+class Sample:
+    query: str
+    started: float
+    latency: float
+    error: str = None
+
+
+@dataclass
+class LoadReport:
+    mode: str
+    target: float
+    duration: float
+    requests: int = 0
+    errors: dict = field(default_factory=dict)
+    latency_ms: dict = field(default_factory=dict)
+    per_query: dict = field(default_factory=dict)
+    timeline: list = field(default_factory=list)
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    values = sorted(latency * 1000 for latency in latencies)
+    if not values:
+        return {}
+    return {f"p{pct:g}": round(percentile(values, pct), 2) for pct in PERCENTILES} | {'max': round(values[-1], 2)}
+
+
+def build_report(samples: list[Sample], mode: str, target: float, duration: float, interval: float) -> LoadReport:
+    report = LoadReport(mode=mode, target=target, duration=duration, requests=len(samples))
+    report.errors = dict(Counter(sample.error for sample in samples if sample.error))
+    report.latency_ms = latency_summary([s.latency for s in samples if s.error != 'Dropped'])
+    for name in sorted({sample.query for sample in samples if sample.error != 'Dropped'}):
+        query_samples = [s for s in samples if s.query == name]
+        report.per_query[name] = {'requests': len(query_samples),
+                                  'errors': sum(1 for s in query_samples if s.error),
+                                  'latency_ms': latency_summary([s.latency for s in query_samples])}
+
+    if samples:
+        start = min(sample.started for sample in samples)
+        buckets: dict[int, list[Sample]] = {}
+        for sample in samples:
+            buckets.setdefault(int((sample.started + sample.latency - start) // interval), []).append(sample)
+        for bucket in range(max(buckets) + 1):
+            bucket_samples = buckets.get(bucket, [])
+            report.timeline.append({
+                'second': round(bucket * interval, 3),
+                'throughput': round(len(bucket_samples) / interval, 2),
+                'errors': sum(1 for s in bucket_samples if s.error),
+                'p99_ms': latency_summary([s.latency for s in bucket_samples]).get('p99'),
+            })
+    return report
+
+
+def print_report(report: LoadReport):
+    print(f"{report.mode} target {report.target:g} for {report.duration:g}s: {report.requests} requests, "
+          f"{sum(report.errors.values())} errors {report.errors or ''}")
+    print('latency ms ' + '  '.join(f"{key} {value}" for key, value in report.latency_ms.items()))
+    for name, stats in report.per_query.items():
+        print(f"  {name:<8} {stats['requests']:>7} requests {stats['errors']:>5} errors  "
+              + '  '.join(f"{key} {value}" for key, value in stats['latency_ms'].items()))
+    print(f"{'t':>8} {'req/s':>8} {'errors':>7} {'p99 ms':>9}")
+    for point in report.timeline:
+        print(f"{point['second']:>8} {point['throughput']:>8} {point['errors']:>7} {point['p99_ms'] or '-':>9}")
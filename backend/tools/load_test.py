@@ -0,0 +1,156 @@
+"""Open-loop GraphQL load generator for the AppSync API.
+
+Provisions a pool of users through the dev test helper, then drives the ``user`` and ``getUser`` queries either at a
+fixed request rate (open loop: requests start on schedule whether or not earlier ones finished, and latency is
+measured from the scheduled start so queueing is not hidden) or with a fixed number of concurrent clients.
+
+Run from the backend directory against LocalStack (or a deployed stage with --endpoint-url):
+
+    PYTHONPATH=./:./lambdas python -m tools.load_test --rps 50 --duration 60 [--mix user=1,getUser=1]
+    PYTHONPATH=./:./lambdas python -m tools.load_test --concurrency 20 --duration 60 [--output load.json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from contextlib import AsyncExitStack
+from dataclasses import asdict
+
+from gql import gql, Client
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportQueryError
+
+from tests.integration.aws_utils import AWSUtils, UserPool, User, build_context
+from tests.integration.cognito_tokens import CachedAppSyncAuthentication
+from tools.load_report import LoadReport, Sample, build_report, print_report
+
+QUERIES = {
+    'user': gql('query { user { userName name email } }'),
+    'getUser': gql('query GetUser($userName: String!) { getUser(userName: $userName) { userName name email } }'),
+}
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in QUERIES:
+            raise argparse.ArgumentTypeError(f"Unknown query '{name}', valid queries are {list(QUERIES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadGenerator:
+
+    def __init__(self, sessions: list, users: list[User], mix: dict[str, float]):
+        self.sessions = sessions
+        self.users = users
+        self.queries = list(mix)
+        self.weights = list(mix.values())
+        self.samples: list[Sample] = []
+
+    async def request(self, scheduled: float):
+        name = random.choices(self.queries, self.weights)[0]
+        session = random.choice(self.sessions)
+        variables = {'userName': random.choice(self.users).username} if name == 'getUser' else None
+        error = None
+        try:
+            await session.execute(QUERIES[name], variable_values=variables)
+        except TransportQueryError as e:
+            error = (e.errors or [{}])[0].get('errorType') or 'GraphQLError'
+        except Exception as e:  # pylint: disable=broad-except
+            error = type(e).__name__
+        self.samples.append(Sample(query=name, started=scheduled, latency=time.perf_counter() - scheduled,
+                                   error=error))
+
+    async def run_open_loop(self, rps: float, duration: float, max_in_flight: int):
+        """Start requests on a fixed schedule. Requests over ``max_in_flight`` are recorded as 'Dropped'."""
+        in_flight = set()
+        start = time.perf_counter()
+        interval = 1 / rps
+        for i in range(int(rps * duration)):
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                self.samples.append(Sample(query='-', started=scheduled, latency=0.0, error='Dropped'))
+                continue
+            task = asyncio.create_task(self.request(scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+    async def run_closed_loop(self, concurrency: int, duration: float):
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            while time.perf_counter() < deadline:
+                await self.request(time.perf_counter())
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+async def run(args, ctx, aws: AWSUtils, users: list[User]) -> LoadReport:
+    async with AsyncExitStack() as stack:
+        sessions = []
+        for user in users:
+            # Tokens are renewed in the background from the refresh token, runs can outlast the token validity
+            auth = CachedAppSyncAuthentication(host=ctx.host, tokens=aws.tokens, user=user)
+            transport = AIOHTTPTransport(url=ctx.graphql_url, auth=auth)
+            client = Client(transport=transport, fetch_schema_from_transport=False, schema=aws.schema,
+                            execute_timeout=args.timeout)
+            sessions.append(await stack.enter_async_context(client))
+
+        generator = LoadGenerator(sessions, users, args.mix)
+        if args.warmup:
+            await generator.run_closed_loop(len(sessions), args.warmup)
+            generator.samples = []
+
+        if args.rps:
+            await generator.run_open_loop(args.rps, args.duration, args.max_in_flight)
+            return build_report(generator.samples, 'rps', args.rps, args.duration, args.interval)
+        await generator.run_closed_loop(args.concurrency, args.duration)
+        return build_report(generator.samples, 'concurrency', args.concurrency, args.duration, args.interval)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--rps', type=float, help='Open loop: requests started per second')
+    target.add_argument('--concurrency', type=int, help='Closed loop: number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of unrecorded warm up load')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('user=1,getUser=1'),
+                        help="Query weights, e.g. 'user=3,getUser=1'")
+    parser.add_argument('--users', type=int, default=10, help='Number of test users to provision')
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='Open loop cap on outstanding requests')
+    parser.add_argument('--timeout', type=float, default=30, help='Per request timeout in seconds')
+    parser.add_argument('--interval', type=float, default=1.0, help='Timeline bucket in seconds')
+    parser.add_argument('--endpoint-url', default='http://localhost:4566')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    ctx = build_context(endpoint_url=args.endpoint_url, region=args.region)
+    aws = AWSUtils(ctx)
+    pool = UserPool(aws, worker='load', size=args.users)
+    try:
+        report = asyncio.run(run(args, ctx, aws, pool.users))
+    finally:
+        pool.destroy()
+        aws.tokens.close()
+
+    print_report(report)
+    print(f"cognito auth calls: {dict(aws.tokens.stats)}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as file:
+            json.dump(asdict(report), file, indent=2)
+    return 1 if report.requests and sum(report.errors.values()) == report.requests else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())